@@ -1,12 +1,229 @@
-import time, os, csv, datetime
+import time, os, io, csv, json, math, bisect, heapq, datetime, gzip, shutil, threading, queue, sqlite3
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
 
 str_format = '%Y%m%d%H%M%S'
 readable_format = '%Y/%m/%d %H:%M:%S'
+compressed_ext = {'gzip': '.gz', 'zstd': '.zst'}
+default_rollups = {'minute': {'period': 60}, 'hour': {'period': 3600}}
+
+def _to_epoch(value):
+	'''
+	Returns a timestamp given as a datetime, epoch seconds (also as a string, as read back from a CSV file) or a
+	readable_format/ISO string in epoch seconds.
+	'''
+	if isinstance(value, datetime.datetime): return value.timestamp()
+	if isinstance(value, (int, float)): return float(value)
+	try:
+		return float(value)
+	except ValueError:
+		pass
+	try:
+		return datetime.datetime.strptime(value, readable_format).timestamp()
+	except ValueError:
+		return datetime.datetime.fromisoformat(value).timestamp()
+
+def _open_data_file(file):
+	'''
+	Opens a csv file, compressed or not, for binary reading.
+	'''
+	if file.endswith(compressed_ext['gzip']): return gzip.open(file, 'rb')
+	if file.endswith(compressed_ext['zstd']):
+		if not zstandard: raise ImportError(f'reading {file} requires the zstandard package')
+		return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(file, 'rb'), closefd=True))
+	return open(file, 'rb')
+
+def _seek_forward(file, offset):
+	'''
+	Moves a file opened with _open_data_file to offset, reading through compressed streams that cannot seek.
+	'''
+	if offset <= file.tell(): return
+	try:
+		file.seek(offset)
+	except (OSError, io.UnsupportedOperation):
+		while file.tell() < offset and file.read(min(65536, offset - file.tell())): pass
+
+class rollup():
+	"""
+	A class that incrementally aggregates the numeric fields of rows into fixed time buckets, writing
+	count/min/max/mean/last per field into its own csv_handler once a bucket is complete. Every field seen so
+	far, including those of the current rollup file, gets columns in every row, empty for buckets without
+	values, so the rollup files only roll over on size.
+
+	Attributes
+	----------
+	period : int
+		Length of a bucket in seconds.
+	handler : csv_handler
+		Handler storing the aggregated rows.
+	bucket : float
+		Start of the current bucket in epoch seconds, None before the first row.
+
+	Methods
+	-------
+	__call__(self, ts, data):
+		Adds a row to the current bucket in O(1), writing the previous bucket when ts falls in a new one.
+	flush(self):
+		Writes the current, possibly incomplete, bucket.
+	query(self, start=None, end=None, fields=None):
+		Generator of the aggregated rows between start and end.
+	"""
+
+	def __init__(self, period, handler):
+		self.period = period
+		self.handler = handler
+		self.bucket = None
+		self._stats = {}
+		header = handler._headers.get(handler._csv_name(handler.writing_to), []) if handler.writing_to else []
+		self._fields = dict.fromkeys(column[:-len('_count')] for column in header if column.endswith('_count'))
+
+	def __call__(self, ts, data):
+		bucket = ts - ts % self.period
+		if bucket != self.bucket:
+			self.flush()
+			self.bucket = bucket
+
+		for field, value in data.items():
+			if field == self.handler.ts_field or isinstance(value, bool): continue
+			try:
+				value = float(value)
+			except (TypeError, ValueError):
+				continue
+			if value != value: continue # NaN
+
+			stats = self._stats.get(field)
+			if stats is None:
+				self._stats[field] = [1, value, value, value, value]
+				self._fields.setdefault(field)
+			else:
+				stats[0] += 1
+				if value < stats[1]: stats[1] = value
+				if value > stats[2]: stats[2] = value
+				stats[3] += value
+				stats[4] = value
+
+	def flush(self):
+		if not self._stats: return
+		row = {self.handler.ts_field: datetime.datetime.fromtimestamp(self.bucket).strftime(readable_format)}
+		for field in self._fields:
+			stats = self._stats.get(field)
+			if stats is None: # no value in this bucket
+				row.update({f'{field}_{stat}': '' for stat in ('count', 'min', 'max', 'mean', 'last')})
+				continue
+			count, minimum, maximum, total, last = stats
+			row[f'{field}_count'] = count
+			row[f'{field}_min'] = minimum
+			row[f'{field}_max'] = maximum
+			row[f'{field}_mean'] = total / count
+			row[f'{field}_last'] = last
+		self._stats = {}
+		self.handler(row)
+
+	def query(self, start=None, end=None, fields=None):
+		return self.handler.query(start, end, fields)
+
+class retention_policy():
+	"""
+	A class that keeps data files in a heap ordered by timestamp and evicts them oldest-first in O(log n)
+	to respect a total size budget and an optional maximum age.
+
+	Attributes
+	----------
+	max_size : int
+		Maximum total size in bytes of the files kept.
+	max_age : float
+		Maximum age in seconds of the newest data of a file, None for no age limit.
+	total_size : int
+		Total size in bytes of the files kept.
+
+	Methods
+	-------
+	add(self, key, ts, size, last=None):
+		Adds a file with its timestamp, size and time of its newest data.
+	update(self, key, size=None, last=None):
+		Updates the size and/or time of the newest data of a file.
+	remove(self, key):
+		Removes a file from the policy.
+	evict(self, incoming=0, now=None, protected=()):
+		Removes and returns the oldest files until incoming bytes fit the budget and no file is expired.
+	"""
+
+	def __init__(self, max_size, max_age=None):
+		self.max_size = max_size
+		self.max_age = max_age
+		self.clear()
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __contains__(self, key):
+		return key in self._entries
+
+	def clear(self):
+		self.total_size = 0
+		self._heap = []
+		self._entries = {}
+
+	def add(self, key, ts, size, last=None):
+		if key in self._entries: self.remove(key)
+		self._entries[key] = [ts, size, ts if last is None else last]
+		heapq.heappush(self._heap, (ts, key))
+		self.total_size += size
+
+	def update(self, key, size=None, last=None):
+		entry = self._entries[key]
+		if size is not None:
+			self.total_size += size - entry[1]
+			entry[1] = size
+		if last is not None and last > entry[2]: entry[2] = last
+
+	def size(self, key):
+		return self._entries[key][1]
+
+	def remove(self, key):
+		entry = self._entries.pop(key, None)
+		if entry is None: return
+		self.total_size -= entry[1]
+		if len(self._heap) > 2 * len(self._entries) + 64: # drop the stale heap items left by removals
+			self._heap = [(ts, key) for ts, key in self._heap if self._entries.get(key, [None])[0] == ts]
+			heapq.heapify(self._heap)
+
+	def evict(self, incoming=0, now=None, protected=()):
+		evicted, kept = [], []
+		expiry = now - self.max_age if self.max_age is not None and now is not None else None
+
+		while self._heap:
+			ts, key = self._heap[0]
+			entry = self._entries.get(key)
+			if entry is None or entry[0] != ts: # removed or re-added since it was pushed
+				heapq.heappop(self._heap)
+				continue
+			if self.total_size + incoming <= self.max_size and (expiry is None or entry[2] >= expiry): break
+
+			heapq.heappop(self._heap)
+			if key in protected:
+				kept.append((ts, key))
+				continue
+			del self._entries[key]
+			self.total_size -= entry[1]
+			evicted.append(key)
+
+		for item in kept: heapq.heappush(self._heap, item)
+		return evicted
 
 class csv_handler():
 	"""
 	A class that maintains a csv file management system. This class is particularly
 	useful for  short-term logging data onto csv files continuously, while maintaining storage capacity.
+	Full csv files are compressed in a background thread so that the same storage budget holds more history.
+	At startup a row left incomplete by a power loss is truncated from the active file, and a change in the
+	fields of the data rolls over to a new file with its own header.
+	Each csv file has a sidecar index of its first/last timestamps and sparse row offsets, used by query()
+	to only open and seek into the files overlapping a time range.
+	Optional rollups keep per-minute/per-hour aggregates of numeric fields in their own rotated file sets.
 
 	Attributes
     ----------
@@ -18,6 +235,17 @@ class csv_handler():
 		Set maximum file size in bytes, in which a CSV file will be maintained.
 	max_handling_size : int
 		Set maximum size in bytes, of all csv files in management system will be maintained before purging full csv files.
+		The .idx sidecar indexes are not counted, about 100 bytes per data file plus 30 bytes per index_interval rows.
+	compression : str
+		Compression used for full csv files ('gzip' or 'zstd'), None if full files are kept uncompressed.
+	ts_field : str
+		Name of the column holding the row timestamps used for indexing and querying.
+	index_interval : int
+		Number of rows between two offsets of the sparse row-offset index.
+	rollups : dict(rollup)
+		Rollups maintained by the handler by name, e.g. rollups['hour'].query(start, end).
+	retention : retention_policy
+		Heap of the data files maintained by the handler, enforcing max_handling_size and max_age oldest-first.
 	data_files : list(dict())
 		List of dictionaries with attributes of files maintained by the handler.
 	writing_to : str
@@ -27,21 +255,27 @@ class csv_handler():
 
 	Methods
 	-------
-	__init__(self, base_dir ='log/', filename='pi_data', max_file_size =89000, max_handling_size = 5000000):
+	__init__(self, base_dir ='log/', filename='pi_data', max_file_size =89000, max_handling_size = 5000000, compression='auto', ts_field='timestamp', index_interval=100, rollups=None, max_age=None):
 		Initialize class object parameters.
 	__call__(self, data):
 		Transfer data to csv_file pointed at the writing_to attribute when class object is called.
 	check_files(self):
-		Checks and updates the parameters of the file management system.
+		Scans base_dir and rebuilds the parameters of the file management system.
 	purge_data_files(self, all_files = False):
 		Purges data files of the file manegement sysetem.
+	compress_file(self, file):
+		Queues a full csv file for compression by the background thread.
+	close(self):
+		Flushes the rollups, saves the index of the active file, waits for pending compressions and stops the background thread.
+	query(self, start=None, end=None, fields=None):
+		Generator of the rows with a timestamp between start and end, read lazily from the overlapping files only.
 	find_ts_path(self, ts, data_files):
 		Returns the filepath of a given timestamp if it exists.
 	push_to_csv(self, csv_file, data):
 		Push data in dictionary form to csv file.
 	"""
 
-	def __init__(self, base_dir ='log/', filename='pi_data', max_file_size =89000, max_handling_size = 5000000):
+	def __init__(self, base_dir ='log/', filename='pi_data', max_file_size =89000, max_handling_size = 5000000, compression='auto', ts_field='timestamp', index_interval=100, rollups=None, max_age=None):
 		'''
 		constructs all necessary attributes for the csv_handler object.
 			Parameters
@@ -54,90 +288,528 @@ class csv_handler():
 					Set maximum file size in kb, in which a CSV file will be maintained.
 				max_handling_size : int
 					Set maximum size in kb, of all csv files in management system will be maintained before purging full csv files.
+				compression : str
+					'auto' (zstd if the zstandard package is installed, gzip otherwise), 'gzip', 'zstd' or None to disable compression of full files.
+				ts_field : str
+					Name of the column holding the row timestamps, added with the current time to rows that do not have it.
+				index_interval : int
+					Number of rows between two offsets of the sparse row-offset index.
+				rollups : dict
+					Rollups to maintain by name, each a dict with a 'period' in seconds and optional max_file_size/max_handling_size/max_age
+					for its own file set named <filename>_<name>. True uses default_rollups (per minute and per hour).
+				max_age : float
+					Maximum age in seconds of the newest row of a file before it is purged, None for no age limit.
 		'''
 		if not os.path.exists(base_dir): os.makedirs(base_dir)
+		if compression == 'auto': compression = 'zstd' if zstandard else 'gzip'
+		if compression == 'zstd' and not zstandard: raise ImportError('zstd compression requires the zstandard package')
+		if compression not in (None, *compressed_ext): raise ValueError(f'unsupported compression: {compression}')
 
 		self.base_dir = base_dir
 		self.filename = filename
 		self.max_file_size = max_file_size *1000
 		self.max_handling_size = max_handling_size *1000
-		self.data_files, self.writing_to, self.total_size = self.check_files()
+		self.compression = compression
+		self.ts_field = ts_field
+		self.index_interval = index_interval
+		self.retention = retention_policy(self.max_handling_size, max_age)
+		self.writing_to = None
+		self._paths = {}
+		self._headers = {}
+		self._index = {}
+		self._file_names = [f'{filename}.csv'] + [f'{filename}.csv{ext}' for ext in compressed_ext.values()]
+		self._lock = threading.RLock()
+		self._compressing = set()
+		self._compress_queue = queue.Queue()
+		self._compress_thread = None
+
+		for file in os.listdir(self.base_dir):
+			if file.endswith('.part') and self._is_data_file(file[:-len('.part')]): os.remove(self.base_dir+file) # interrupted compression
+
+		self.check_files()
+		self._load_index()
+
+		if rollups is True: rollups = default_rollups
+		self.rollups = {}
+		for name, config in (rollups or {}).items():
+			config = dict(config)
+			period = config.pop('period')
+			handler = csv_handler(base_dir=base_dir, filename=f'{filename}_{name}', compression=compression, ts_field=ts_field, index_interval=index_interval, **config)
+			self.rollups[name] = rollup(period, handler)
 
 	def __call__(self, data):
 		'''
 		Transfer data to csv_file pointed at the writing_to attribute when class object is called.
+		The oldest files are purged before writing so that the handling size is never exceeded.
 			Parameters
 			----------
 				data : <class dict>
 					Dictionary with key and values to be written to the csv file pointed by the written_to attribute
 		'''
-		self.check_files()
+		if self.ts_field in data:
+			try:
+				ts = _to_epoch(data[self.ts_field])
+			except (TypeError, ValueError):
+				ts = time.time()
+		else:
+			ts = time.time()
+			data = {**data, self.ts_field: datetime.datetime.fromtimestamp(ts).strftime(readable_format)}
+
+		if self.writing_to and set(data) != set(self._headers.get(self._csv_name(self.writing_to), data)):
+			self._close_file(self.writing_to) # fields changed, continue in a new file with a new header
 		if not self.writing_to:
-			ts = datetime.datetime.now().strftime(str_format)
-			self.writing_to = f'{self.base_dir}{ts}_{self.filename}.csv'
-		self.push_to_csv(self.writing_to, data)
-		self.check_files()
+			self.writing_to = self._new_file_path()
+		file = self.writing_to
+		name = self._csv_name(file)
+		new_file = name not in self._paths
+
+		if new_file: self._headers[name] = list(data)
+		fieldnames = self._headers.setdefault(name, list(data))
+		header = self._format_row(fieldnames) if new_file else ''
+		row = self._format_row(fieldnames, data)
+		self._purge(len(header.encode()) + len(row.encode()))
+
+		offset, size = self._append(file, header, row)
+		with self._lock:
+			if new_file:
+				self.retention.add(name, self._name_ts(name), size, ts)
+				self._paths[name] = file
+			else:
+				self.retention.update(name, size, ts)
+		self._index_row(file, ts, offset, size)
+
+		if size > self.max_file_size: self._close_file(file)
+
+		for tier in self.rollups.values(): tier(ts, data)
+
+	def _close_file(self, file):
+		'''
+		Stops writing to file, saving its final index and queuing it for compression.
+		'''
+		self._save_index(file)
+		self._headers.pop(self._csv_name(file), None)
+		if file == self.writing_to: self.writing_to = None
+		if self.compression: self.compress_file(file)
+
+	@property
+	def data_files(self):
+		'''
+		List of dictionaries with attributes of files maintained by the handler.
+		'''
+		data_files = []
+		for name, file in sorted(self._paths.items()):
+			try:
+				file_stats = os.stat(file)
+			except FileNotFoundError:
+				continue # compressed since listing
+			if not file.endswith('.csv'):
+				status = 'compressed'
+			else:
+				status = 'active' if file == self.writing_to else 'full'
+			data_files.append({ 'file': file,
+								'size': file_stats.st_size,
+								'last_modified': datetime.datetime.fromtimestamp(file_stats.st_mtime).strftime(readable_format),
+								'status': status
+							  })
+		return data_files
+
+	@property
+	def total_size(self):
+		'''
+		Total size, in bytes, of all csv files in maintained in the management system.
+		'''
+		return self.retention.total_size
+
+	def _new_file_path(self):
+		'''
+		Returns the path of a new csv file named after the current time. The timestamp is moved forward
+		if a file (or its compressed copy) already uses it, so that a compressed file is never overwritten.
+		'''
+		ts = datetime.datetime.now()
+		while f'{ts.strftime(str_format)}_{self.filename}.csv' in self._paths:
+			ts += datetime.timedelta(seconds=1)
+		return f'{self.base_dir}{ts.strftime(str_format)}_{self.filename}.csv'
+
+	def _is_data_file(self, name):
+		'''
+		Returns True if name is the name of a (possibly compressed) csv file of this handler.
+		'''
+		ts, sep, rest = name.partition('_')
+		return bool(sep) and ts.isdigit() and rest in self._file_names
+
+	@staticmethod
+	def _file_ts(file):
+		'''
+		Returns the timestamp string encoded in the name of a data file.
+		'''
+		return os.path.basename(file).split('_')[0]
+
+	def _name_ts(self, file):
+		'''
+		Returns the timestamp encoded in the name of a data file as an integer ordered like the timestamps.
+		'''
+		return int(self._file_ts(file))
 
 	def check_files(self):
 		'''
-		Checks and updates the parameters of the file management system.
+		Scans base_dir and rebuilds the parameters of the file management system. Writing does not
+		need this scan, the handler keeps track of the files it writes, compresses and purges.
 			Returns
 			-------
 			(self.data_files, self.writing_to, self.total_size) : <class tuple>
 				data_files, writing_to, total_size attributes of csv_handler object
 		'''
-		data_file_paths = [self.base_dir+file for file in os.listdir(self.base_dir) if os.path.isfile(self.base_dir+file) and self.filename in file and '.csv' in file]
+		with self._lock:
+			self.retention.clear()
+			self._paths = {}
 
-		data_files = []
-		total_size = 0
+			for file in sorted(os.listdir(self.base_dir), key=lambda file: file.endswith('.csv')):
+				path = self.base_dir+file
+				if not self._is_data_file(file) or not os.path.isfile(path): continue
+				name = self._csv_name(file)
+				if name in self._paths: # compression completed but the original was not removed
+					os.remove(path)
+					continue
+				file_stats = os.stat(path)
+				self.retention.add(name, self._name_ts(name), file_stats.st_size, file_stats.st_mtime)
+				self._paths[name] = path
 
-		for file in data_file_paths:
-			file_stats = os.stat(file)
+		active_files = [{'file': file} for name, file in self._paths.items() if file.endswith('.csv') and self.retention.size(name) <= self.max_file_size]
+		ts = max([self._file_ts(file['file']) for file in active_files], default=None)
+		self.writing_to = self.find_ts_path(ts, active_files) if ts else None
+		if self.writing_to: self._recover(self.writing_to)
 
-			data_file = {   'file': file,
-							'size': file_stats.st_size,
-							'last_modified': datetime.datetime.fromtimestamp(file_stats.st_mtime).strftime(readable_format),
-							'status': 'active' if file_stats.st_size <= self.max_file_size else 'full'
-						  }
+		for name, file in list(self._paths.items()):
+			if file.endswith('.csv') and file != self.writing_to and self.compression: self.compress_file(file)
+		self._purge()
 
-			total_size += data_file['size']
-			data_files.append(data_file)
+		return self.data_files, self.writing_to, self.total_size
 
-		self.data_files = data_files
-		self.total_size = total_size
+	def _recover(self, file, block_size=4096):
+		'''
+		Truncates file after its last complete line, dropping a row cut short by a power loss, and caches
+		its header. Only the tail of the file is read, so recovery does not depend on the file size.
+		'''
+		name = self._csv_name(file)
+		with open(file, 'rb+') as f:
+			size = end = f.seek(0, os.SEEK_END)
+			complete = 0
+			while end > 0:
+				start = max(0, end - block_size)
+				f.seek(start)
+				newline = f.read(end - start).rfind(b'\n')
+				if newline >= 0:
+					complete = start + newline + 1
+					break
+				end = start
 
-		if self.total_size > self.max_handling_size: self.purge_data_files()
-		active_files = [file for file in data_files if file['status'] == 'active']
+			if complete != size:
+				print(f'{file}: truncating {size - complete} bytes of incomplete row')
+				f.truncate(complete)
+			if complete:
+				f.seek(0)
+				self._headers[name] = next(csv.reader([f.readline().decode()]))
 
-		if active_files:
-			ts = max([datetime.datetime.strptime(file['file'].split('_')[0].split('/')[-1], str_format) for file in active_files]).strftime(str_format)
-			self.writing_to = self.find_ts_path(ts, active_files)
-		elif not active_files:
-			self.writing_to = None
+		with self._lock:
+			if complete:
+				self.retention.update(name, complete)
+				return
+			self.retention.remove(name) # not even a complete header, start the file over
+			del self._paths[name]
+		os.remove(file)
+		if file == self.writing_to: self.writing_to = None
 
-		return self.data_files, self.writing_to, self.total_size
+	def _purge(self, incoming=0):
+		'''
+		Purges the oldest files, other than the one being written to, until incoming bytes fit within
+		the handling size and no file is older than max_age.
+		'''
+		with self._lock:
+			protected = (self._csv_name(self.writing_to),) if self.writing_to else ()
+			for name in self.retention.evict(incoming, time.time(), protected):
+				try:
+					os.remove(self._paths.pop(name))
+				except FileNotFoundError:
+					pass
+				self._drop_index(name)
 
 	def purge_data_files(self, all_files = False):
 		'''
-		Purges data files of the file manegement sysetem.
+		Purges data files of the file manegement sysetem, oldest first, until the handling size and maximum age are respected.
 			Parameters
 			----------
 				all_files : bool
 					Determines purging all files(True) or full files(False) only
 		'''
-		if all_files:
-			for  data_file in self.data_files:
-				os.remove(data_file['file'])
-				self.data_files.remove(data_file)
-		else:
-			for data_file in self.data_files:
-				if data_file['status'] =='full':
-					os.remove(data_file['file'])
-					self.data_files.remove(data_file)
-				else:
+		if not all_files: return self._purge()
+
+		self._compress_queue.join()
+		with self._lock:
+			for name, file in self._paths.items():
+				try:
+					os.remove(file)
+				except FileNotFoundError:
 					pass
+				self._drop_index(name)
+			self._paths = {}
+			self._headers = {}
+			self.retention.clear()
+			self.writing_to = None
 
-		self.total_size = sum([file['size'] for file in self.data_files])
+	def compress_file(self, file):
+		'''
+		Queues a full csv file for compression by the background thread.
+			Parameters
+			----------
+				file : str
+					path to the csv file to be compressed
+		'''
+		with self._lock:
+			if file in self._compressing: return
+			self._compressing.add(file)
+
+		if not self._compress_thread or not self._compress_thread.is_alive():
+			self._compress_thread = threading.Thread(target=self._compression_worker, daemon=True)
+			self._compress_thread.start()
+
+		self._compress_queue.put(file)
+
+	def _compression_worker(self):
+		'''
+		Background thread compressing queued csv files until a None sentinel is received.
+		'''
+		while True:
+			file = self._compress_queue.get()
+			try:
+				if file is None: return
+				self._compress(file)
+			except OSError as e:
+				print(f'Failed to compress {file}. Reason: {e}')
+			finally:
+				with self._lock: self._compressing.discard(file)
+				self._compress_queue.task_done()
+
+	def _compress(self, file):
+		'''
+		Compresses file next to itself and replaces the original once the compressed copy is complete,
+		unless the file was purged in the meantime.
+		'''
+		name = self._csv_name(file)
+		compressed_file = file + compressed_ext[self.compression]
+		part_file = compressed_file + '.part'
+
+		try:
+			src = open(file, 'rb')
+		except FileNotFoundError: # purged before it could be compressed
+			return
+
+		with src:
+			if self.compression == 'zstd':
+				with open(part_file, 'wb') as dst:
+					zstandard.ZstdCompressor().copy_stream(src, dst)
+			else:
+				with gzip.open(part_file, 'wb') as dst:
+					shutil.copyfileobj(src, dst)
+
+		with self._lock:
+			if self._paths.get(name) != file:
+				os.remove(part_file)
+				return
+			os.replace(part_file, compressed_file)
+			os.remove(file)
+			self._paths[name] = compressed_file
+			self.retention.update(name, os.path.getsize(compressed_file))
+
+	def close(self):
+		'''
+		Flushes the rollups, saves the index of the active file, waits for pending compressions and stops the background thread.
+		'''
+		for tier in self.rollups.values():
+			tier.flush()
+			tier.handler.close()
+		if self.writing_to: self._save_index(self.writing_to)
+		if self._compress_thread and self._compress_thread.is_alive():
+			self._compress_queue.put(None)
+			self._compress_thread.join()
+		self._compress_thread = None
+
+	def _csv_name(self, file):
+		'''
+		Returns the name of the uncompressed csv file of a data file, used as its key in the index.
+		'''
+		name = os.path.basename(file)
+		return name[:name.index('.csv') + len('.csv')]
+
+	def _index_path(self, file):
+		'''
+		Returns the path of the sidecar index of a data file.
+		'''
+		return f'{self.base_dir}{self._csv_name(file)}.idx'
+
+	def _index_row(self, file, ts, offset, size):
+		'''
+		Adds a row written at offset of file to the index, saving the sidecar whenever a sparse offset is added.
+		'''
+		entry = self._index.setdefault(self._csv_name(file), {'first': ts, 'last': ts, 'rows': 0, 'size': 0, 'offsets': []})
+		checkpoint = entry['rows'] % self.index_interval == 0
+
+		if checkpoint: entry['offsets'].append([ts, offset])
+		entry['first'] = min(entry['first'], ts)
+		entry['last'] = max(entry['last'], ts)
+		entry['rows'] += 1
+		entry['size'] = size
+
+		if checkpoint: self._save_index(file)
+
+	def _save_index(self, file):
+		'''
+		Atomically writes the sidecar index of a data file.
+		'''
+		entry = self._index.get(self._csv_name(file))
+		if entry is None: return
+		index_path = self._index_path(file)
+		with open(index_path + '.tmp', 'w') as f:
+			json.dump(entry, f)
+		os.replace(index_path + '.tmp', index_path)
+
+	def _drop_index(self, file):
+		'''
+		Removes a purged data file from the index and deletes its sidecar.
+		'''
+		self._index.pop(self._csv_name(file), None)
+		try:
+			os.remove(self._index_path(file))
+		except FileNotFoundError:
+			pass
+
+	def _load_index(self):
+		'''
+		Loads the sidecar indexes of all data files and indexes the rows written after a sidecar was last saved.
+		'''
+		self._index = {}
+		with self._lock: names = list(self._paths)
+		for name in names:
+			try:
+				with open(self._index_path(name)) as f:
+					self._index[name] = json.load(f)
+			except (OSError, ValueError):
+				pass
+
+			entry = self._index.get(name)
+			with self._lock: # full files are being compressed in the background
+				file = self._paths.get(name)
+				if file is None: continue
+				stale = entry is None or (file.endswith('.csv') and self.retention.size(name) != entry['size'])
+			if stale: self._reindex(file)
+
+		for file in os.listdir(self.base_dir):
+			name = file[:-len('.idx')]
+			if file.endswith('.idx') and self._is_data_file(name) and name not in self._index: os.remove(self.base_dir+file) # orphaned sidecar
+
+	def _reindex(self, file):
+		'''
+		Indexes the rows of file that follow the last indexed row, or all rows if the file has no index yet.
+		'''
+		name = self._csv_name(file)
+		entry = self._index.get(name)
+		if entry is not None and entry['offsets']: # restart from the last sparse offset so checkpoints stay evenly spaced
+			ts, offset = entry['offsets'].pop()
+			entry['rows'] = len(entry['offsets']) * self.index_interval
+		else:
+			self._index.pop(name, None)
+			offset = None
+
+		f = self._open_current(file)
+		if f is None: return
+
+		with f:
+			header_line = f.readline()
+			header = next(csv.reader([header_line.decode()]), [])
+			if self.ts_field not in header: return
+			column = header.index(self.ts_field)
+
+			position = offset or len(header_line)
+			_seek_forward(f, position)
+			for line in f:
+				if not line.endswith(b'\n'): break # incomplete last row
+				try:
+					ts = _to_epoch(next(csv.reader([line.decode()]))[column])
+				except (StopIteration, IndexError, TypeError, ValueError):
+					position += len(line)
+					continue
+				entry = self._index.setdefault(name, {'first': ts, 'last': ts, 'rows': 0, 'size': 0, 'offsets': []})
+				if entry['rows'] % self.index_interval == 0: entry['offsets'].append([ts, position])
+				entry['first'] = min(entry['first'], ts)
+				entry['last'] = max(entry['last'], ts)
+				entry['rows'] += 1
+				position += len(line)
+				entry['size'] = position
+
+		self._save_index(file)
+
+	def query(self, start=None, end=None, fields=None):
+		'''
+		Generator of the rows with a timestamp between start and end. Only the files whose indexed time span
+		overlaps the range are opened, reading starts from the nearest sparse offset before start and stops
+		at the first row past end.
+			Parameters
+			----------
+				start : datetime, float or str
+					Start of the time range (inclusive), None for no lower bound
+				end : datetime, float or str
+					End of the time range (inclusive), None for no upper bound
+				fields : list(str)
+					Columns to return besides the ts_field column, None for all columns
+			Yields
+			-------
+				row : <class dict>
+					Row of a csv file, values as strings
+		'''
+		start = _to_epoch(start) if start is not None else float('-inf')
+		end = _to_epoch(end) if end is not None else float('inf')
+		with self._lock: files = dict(self._paths)
+
+		for name, entry in sorted(self._index.items(), key=lambda item: item[1]['first']):
+			if entry['last'] < start or entry['first'] > end or name not in files: continue
+			offsets = entry['offsets']
+			i = bisect.bisect_right([ts for ts, offset in offsets], start) - 1
+			yield from self._read_rows(files[name], offsets[i][1] if i >= 0 else None, start, end, fields)
+
+	def _open_current(self, file):
+		'''
+		Opens the current version of a data file, compressed or not, or returns None if it was purged.
+		'''
+		name = self._csv_name(file)
+		with self._lock: file = self._paths.get(name, file)
+		for path in [file] + [self.base_dir + name + ext for ext in compressed_ext.values()]:
+			try:
+				return _open_data_file(path)
+			except FileNotFoundError: # compressed since the path was looked up
+				continue
+		return None
+
+	def _read_rows(self, file, offset, start, end, fields):
+		'''
+		Generator of the rows of file from offset with a timestamp between start and end.
+		'''
+		f = self._open_current(file)
+		if f is None: return
+
+		with f:
+			header = next(csv.reader([f.readline().decode()]), [])
+			if self.ts_field not in header: return
+			column = header.index(self.ts_field)
+			if offset: _seek_forward(f, offset)
+
+			for row in csv.reader(line.decode() for line in f):
+				try:
+					ts = _to_epoch(row[column])
+				except (IndexError, TypeError, ValueError):
+					continue
+				if ts < start: continue
+				if ts > end: return
+				row = dict(zip(header, row))
+				yield row if fields is None else {key: row.get(key) for key in [self.ts_field, *fields]}
 
 	def find_ts_path(self, ts, data_files):
 		'''
@@ -159,8 +831,7 @@ class csv_handler():
 			if ts in file['file']:
 				file_path = file['file']
 				return file_path
-			else:
-				return None
+		return None
 
 	def push_to_csv(self, csv_file, data):
 		'''
@@ -171,18 +842,256 @@ class csv_handler():
 					path to csv file
 				data : <class dict>
 					dictionary with key and values to be transfered to csv file
+			Returns
+			-------
+				(offset, size) : <class tuple>
+					byte offset at which the row was written and size of the file after writing
 		'''
 		fieldnames = [label for label, paremeter in data.items()]
+		header = self._format_row(fieldnames) if not os.path.isfile(csv_file) else ''
+		return self._append(csv_file, header, self._format_row(fieldnames, data))
 
-		if not os.path.isfile(csv_file):
-			with open(csv_file, 'w', newline='') as file:
-				writer = csv.DictWriter(file, fieldnames =fieldnames)
-				writer.writeheader()
-				writer.writerow(data)
+	@staticmethod
+	def _format_row(fieldnames, data=None):
+		'''
+		Returns a csv row of data, or the header row if data is None.
+		'''
+		buffer = io.StringIO()
+		writer = csv.DictWriter(buffer, fieldnames =fieldnames)
+		if data is None:
+			writer.writeheader()
 		else:
-			with open(csv_file, 'a', newline='') as file:
-				writer = csv.DictWriter(file, fieldnames =fieldnames)
-				writer.writerow(data)
+			writer.writerow(data)
+		return buffer.getvalue()
+
+	@staticmethod
+	def _append(csv_file, header, row):
+		'''
+		Appends header and row to csv_file, returns the byte offset of row and the size of the file after writing.
+		'''
+		with open(csv_file, 'ab') as file:
+			file.write(header.encode())
+			offset = file.tell()
+			file.write(row.encode())
+			return offset, file.tell()
+
+class sqlite_handler():
+	"""
+	A class that maintains a SQLite database for logging data continuously, with the same call interface
+	as csv_handler. The database runs in WAL mode, rows are inserted in batched transactions and indexed
+	by timestamp and label, and the oldest rows are deleted in chunks to keep the database within its size budget.
+
+	Attributes
+	----------
+	base_dir : str
+		Path to the directory used for storing the database.
+	filename : str
+		Base file name of the database.
+	max_handling_size : int
+		Set maximum size in bytes of the data held by the database before the oldest rows are deleted.
+	batch_size : int
+		Number of rows buffered before they are inserted in one transaction.
+	batch_interval : float
+		Maximum time in seconds rows stay buffered before they are inserted, by a timer if no other row arrives.
+	label : str
+		Label stored with rows that do not have a 'label' key.
+	ts_field : str
+		Name of the key holding the row timestamps.
+	writing_to : str
+		Path to the database file.
+	total_size : int
+		Size, in bytes, of the data held by the database.
+
+	Methods
+	-------
+	__init__(self, base_dir ='log/', filename='pi_data', max_handling_size = 5000000, batch_size=100, batch_interval=5, label=None, ts_field='timestamp', purge_chunk=1000, purge_fraction=0.1):
+		Initialize class object parameters and open the database.
+	__call__(self, data):
+		Buffers data and inserts the buffered rows once batch_size or batch_interval is reached.
+	flush(self):
+		Inserts the buffered rows in one transaction and enforces the size budget.
+	purge_data_files(self, all_files = False):
+		Deletes the oldest rows over the size budget in chunks, or all rows.
+	query(self, start=None, end=None, fields=None, label=None):
+		Generator of the rows with a timestamp between start and end.
+	close(self):
+		Flushes the buffered rows and closes the database.
+	"""
+
+	def __init__(self, base_dir ='log/', filename='pi_data', max_handling_size = 5000000, batch_size=100, batch_interval=5, label=None, ts_field='timestamp', purge_chunk=1000, purge_fraction=0.1):
+		'''
+		constructs all necessary attributes for the sqlite_handler object.
+			Parameters
+			----------
+				base_dir : str
+					Path to the directory used for storing the database.
+				filename : str
+					Base file name of the database.
+				max_handling_size : int
+					Set maximum size in kb of the data held by the database before the oldest rows are deleted.
+				batch_size : int
+					Number of rows buffered before they are inserted in one transaction.
+				batch_interval : float
+					Maximum time in seconds rows stay buffered before they are inserted.
+				label : str
+					Label stored with rows that do not have a 'label' key, defaults to filename.
+				ts_field : str
+					Name of the key holding the row timestamps, added with the current time to rows that do not have it.
+				purge_chunk : int
+					Maximum number of rows deleted per transaction when enforcing the size budget.
+				purge_fraction : float
+					Maximum fraction of the rows deleted per transaction when enforcing the size budget.
+		'''
+		if not os.path.exists(base_dir): os.makedirs(base_dir)
+
+		self.base_dir = base_dir
+		self.filename = filename
+		self.max_handling_size = max_handling_size *1000
+		self.batch_size = batch_size
+		self.batch_interval = batch_interval
+		self.label = label or filename
+		self.ts_field = ts_field
+		self.purge_chunk = purge_chunk
+		self.purge_fraction = purge_fraction
+		self.writing_to = f'{base_dir}{filename}.db'
+		self._rows = []
+		self._newest_id = None # id of the first row of the last inserted batch, never purged
+		self._last_flush = time.monotonic()
+		self._timer = None
+		self._closed = False
+		self._lock = threading.Lock()
+
+		self._db = sqlite3.connect(self.writing_to, isolation_level=None, check_same_thread=False)
+		self._db.execute('PRAGMA journal_mode=WAL')
+		self._db.execute('PRAGMA synchronous=NORMAL')
+		self._db.execute(f'PRAGMA journal_size_limit={4 * 1024 * 1024}')
+		self._db.execute('CREATE TABLE IF NOT EXISTS samples (id INTEGER PRIMARY KEY, ts REAL NOT NULL, label TEXT, data TEXT NOT NULL)')
+		self._db.execute('CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts)')
+		self._db.execute('CREATE INDEX IF NOT EXISTS samples_label_ts ON samples (label, ts)')
+		self.total_size = self._data_size()
+
+	def __call__(self, data):
+		'''
+		Buffers data and inserts the buffered rows once batch_size or batch_interval is reached.
+			Parameters
+			----------
+				data : <class dict>
+					Dictionary with key and values to be stored, must be JSON serializable
+		'''
+		if self.ts_field in data:
+			try:
+				ts = _to_epoch(data[self.ts_field])
+			except (TypeError, ValueError):
+				ts = time.time()
+		else:
+			ts = time.time()
+			data = {**data, self.ts_field: datetime.datetime.fromtimestamp(ts).strftime(readable_format)}
+
+		with self._lock:
+			self._rows.append((ts, data.get('label', self.label), json.dumps(data)))
+			full = len(self._rows) >= self.batch_size or time.monotonic() - self._last_flush >= self.batch_interval
+			if not full and self._timer is None:
+				self._timer = threading.Timer(self.batch_interval, self.flush)
+				self._timer.daemon = True
+				self._timer.start()
+
+		if full: self.flush()
+
+	def flush(self):
+		'''
+		Inserts the buffered rows in one transaction and enforces the size budget.
+		'''
+		with self._lock:
+			if self._timer is not None:
+				self._timer.cancel()
+				self._timer = None
+			if self._closed: return
+			rows, self._rows = self._rows, []
+			self._last_flush = time.monotonic()
+			if rows:
+				self._db.execute('BEGIN')
+				self._newest_id = self._db.execute('SELECT coalesce(max(id), 0) + 1 FROM samples').fetchone()[0]
+				self._db.executemany('INSERT INTO samples (ts, label, data) VALUES (?, ?, ?)', rows)
+				self._db.execute('COMMIT')
+			self.total_size = self._data_size()
+
+		if self.total_size > self.max_handling_size: self.purge_data_files()
+
+	def _data_size(self):
+		'''
+		Returns the size in bytes of the pages in use, pages freed by deleted rows are reused by new rows.
+		'''
+		page_size = self._db.execute('PRAGMA page_size').fetchone()[0]
+		page_count = self._db.execute('PRAGMA page_count').fetchone()[0]
+		freelist_count = self._db.execute('PRAGMA freelist_count').fetchone()[0]
+		return (page_count - freelist_count) * page_size
+
+	def purge_data_files(self, all_files = False):
+		'''
+		Deletes the oldest rows over the size budget. The number of rows is estimated from the bytes over budget and
+		the average row size, as the pages of deleted rows are reused rather than freed, and they are deleted in
+		chunks of at most purge_chunk rows and purge_fraction of the rows. The rows of the last inserted batch are
+		never deleted.
+			Parameters
+			----------
+				all_files : bool
+					Determines deleting all rows(True) or the oldest rows over budget(False) only
+		'''
+		with self._lock:
+			if all_files:
+				self._db.execute('DELETE FROM samples')
+			else:
+				size = self._data_size()
+				count = self._db.execute('SELECT count(*) FROM samples').fetchone()[0]
+				if size > self.max_handling_size and count:
+					newest_id = self._newest_id if self._newest_id is not None else float('inf')
+					remaining = math.ceil((size - self.max_handling_size) / (size / count))
+					chunk = max(1, min(self.purge_chunk, int(count * self.purge_fraction)))
+					while remaining > 0:
+						deleted = self._db.execute('DELETE FROM samples WHERE id IN (SELECT id FROM samples WHERE id < ? ORDER BY id LIMIT ?)', (newest_id, min(remaining, chunk))).rowcount
+						if not deleted: break
+						remaining -= deleted
+			self.total_size = self._data_size()
+
+	def query(self, start=None, end=None, fields=None, label=None):
+		'''
+		Generator of the rows with a timestamp between start and end, using the timestamp/label indexes.
+			Parameters
+			----------
+				start : datetime, float or str
+					Start of the time range (inclusive), None for no lower bound
+				end : datetime, float or str
+					End of the time range (inclusive), None for no upper bound
+				fields : list(str)
+					Keys to return besides the ts_field key, None for all keys
+				label : str
+					Only return rows stored with this label, None for all labels
+			Yields
+			-------
+				row : <class dict>
+					Row as stored
+		'''
+		self.flush()
+		start = _to_epoch(start) if start is not None else float('-inf')
+		end = _to_epoch(end) if end is not None else float('inf')
+
+		if label is None:
+			cursor = self._db.execute('SELECT data FROM samples WHERE ts BETWEEN ? AND ? ORDER BY ts', (start, end))
+		else:
+			cursor = self._db.execute('SELECT data FROM samples WHERE label = ? AND ts BETWEEN ? AND ? ORDER BY ts', (label, start, end))
+
+		for (data,) in cursor:
+			row = json.loads(data)
+			yield row if fields is None else {key: row.get(key) for key in [self.ts_field, *fields]}
+
+	def close(self):
+		'''
+		Flushes the buffered rows and closes the database.
+		'''
+		self.flush()
+		with self._lock:
+			self._closed = True
+			self._db.close()
 
 if __name__ == '__main__':
 
@@ -196,6 +1105,7 @@ if __name__ == '__main__':
 	print(test_csv.total_size)
 
 	test_csv(test_data)
+	test_csv.close()
 
 
 	lol_csv = csv_handler()
@@ -205,3 +1115,4 @@ if __name__ == '__main__':
 	print(lol_csv.data_files)
 	print(lol_csv.writing_to)
 	print(lol_csv.total_size)
+	lol_csv.close()
@@ -1,27 +1,303 @@
-import os, time
+import os, re, json, time, errno, select, socket, ctypes, hashlib, tarfile, platform, threading, subprocess
 
-def get_devices(mount = False):
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+NETLINK_KOBJECT_UEVENT = 15
+SYNC_MANIFEST = '.sync_manifest.json'
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_WHO_PROCESS = 1
+MS_RDONLY = 1
+MS_SYNCHRONOUS = 16
+UID_MOUNT_FILESYSTEMS = ('vfat', 'exfat', 'ntfs', 'ntfs3') # filesystems without owners, mounted for the calling user
+IOPRIO_SYSCALLS = {'x86_64': (251, 252), 'i686': (289, 290), 'aarch64': (30, 31), 'armv7l': (314, 315), 'armv6l': (314, 315)} # (ioprio_set, ioprio_get)
+
+def _read(path, default=None):
+    """return the stripped content of a sysfs/procfs file, default if it cannot be read"""
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+def _unescape(name):
+    """decode the \\xNN (udev links) and \\NNN (/proc/mounts) escapes used for spaces and special characters"""
+    name = re.sub(r'\\x([0-9a-fA-F]{2})', lambda m: chr(int(m.group(1), 16)), name)
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), name)
+
+def _disk_links(root='/'):
+    """return {dev_name: {'UUID':..., 'LABEL':..., 'PARTUUID':...}} from the /dev/disk/by-* symlinks"""
+    links = {}
+    for key, folder in (('UUID', 'by-uuid'), ('LABEL', 'by-label'), ('PARTUUID', 'by-partuuid')):
+        link_dir = f'{root}dev/disk/{folder}'
+        try:
+            names = os.listdir(link_dir)
+        except OSError:
+            continue
+        for name in names:
+            try:
+                target = os.path.basename(os.readlink(os.path.join(link_dir, name)))
+            except OSError:
+                continue
+            links.setdefault(target, {})[key] = _unescape(name)
+    return links
+
+def _mounts(root='/'):
+    """return {dev_name: (mount point, filesystem type)} from /proc/mounts"""
+    mounts = {}
+    for line in (_read(f'{root}proc/mounts', '') or '').splitlines():
+        fields = line.split()
+        if len(fields) >= 3 and fields[0].startswith('/dev/'):
+            mounts.setdefault(fields[0].split('/')[-1], (_unescape(fields[1]), fields[2]))
+    return mounts
+
+def _udev_properties(class_dir, root='/'):
+    """return the properties udev recorded for a block device in /run/udev/data/b<major>:<minor>, e.g. ID_FS_TYPE"""
+    properties = {}
+    for line in (_read(f'{root}run/udev/data/b{_read(f"{class_dir}/dev", "")}', '') or '').splitlines():
+        if line.startswith('E:') and '=' in line:
+            key, value = line[2:].split('=', 1)
+            properties[key] = value
+    return properties
+
+def _block_devices(root='/'):
+    """return the names of sd* partitions, or of whole sd* disks without partitions, listed in /sys/block"""
+    names = []
+    try:
+        disks = sorted(os.listdir(f'{root}sys/block'))
+    except OSError:
+        return names
+    for disk in disks:
+        if not disk.startswith('sd'):
+            continue
+        disk_dir = f'{root}sys/block/{disk}'
+        try:
+            partitions = [entry for entry in sorted(os.listdir(disk_dir)) if entry.startswith(disk) and os.path.exists(f'{disk_dir}/{entry}/partition')]
+        except OSError: # removed while listing
+            continue
+        if partitions:
+            names += partitions
+        elif int(_read(f'{disk_dir}/size', '0') or 0):
+            names.append(disk)
+    return names
+
+def get_device_attrs(root='/'):
+    """
+    return a list of device attribute dictionaries {'loc':'/dev/<dev interface>', ...} of the sd* block storage
+    devices, read from /sys/block, /sys/class/block, /dev/disk, the udev database and /proc/mounts without spawning a process.
+    root can point to a fake filesystem tree for testing.
+    """
+    links = _disk_links(root)
+    mounts = _mounts(root)
+    device_attrs = []
+
+    for dev_name in _block_devices(root):
+        class_dir = f'{root}sys/class/block/{dev_name}'
+        disk = re.sub(r'\d+$', '', dev_name)
+        attrs = {'loc': f'/dev/{dev_name}',
+                 'SIZE': int(_read(f'{class_dir}/size', '0') or 0) * 512,
+                 'REMOVABLE': _read(f'{root}sys/block/{disk}/removable') == '1',
+                 'USB': '/usb' in os.path.realpath(class_dir)}
+        attrs.update(links.get(dev_name, {}))
+        fstype = _udev_properties(class_dir, root).get('ID_FS_TYPE')
+        if fstype: attrs['TYPE'] = fstype
+        if dev_name in mounts:
+            attrs['MOUNTPOINT'], attrs['TYPE'] = mounts[dev_name]
+        device_attrs.append(attrs)
+
+    return device_attrs
+
+def get_devices(mount = False, root='/'):
     '''
     initiate and return a list of USB_SD objects obtained at the state it was called.
     '''
-    storage_devices = []
-    devices = os.popen('blkid').readlines()
+    return [USB_SD(attrs = device_attrs, mount=mount) for device_attrs in get_device_attrs(root)]
 
-    for dev_str in devices:
-        loc, params = dev_str.split(': ')
-        if "/sd" not in loc:
-            continue
-        device_attrs = {'loc':loc}
-        for attr in params.split(' '): device_attrs[attr.split('=')[0]] = attr.split('=')[1].strip('"\n')
-        storage_devices.append(USB_SD(attrs = device_attrs, mount=mount))
+def _file_checksum(path, chunk_size=1 << 20):
+    """return the sha256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _copy_range(src_fd, dst_fd, offset, count, chunk_size):
+    """
+    copy count bytes from offset of src_fd to the same offset of dst_fd in chunks, inside the kernel with
+    copy_file_range(), or sendfile() when the filesystems do not support it. return the bytes copied.
+    """
+    copied = 0
+    use_copy_file_range = hasattr(os, 'copy_file_range')
+    while copied < count:
+        position = offset + copied
+        size = min(chunk_size, count - copied)
+        sent = None
+        if use_copy_file_range:
+            try:
+                sent = os.copy_file_range(src_fd, dst_fd, size, position, position)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP): raise
+                use_copy_file_range = False # e.g. SD card ext4 to USB vfat
+        if sent is None:
+            os.lseek(dst_fd, position, os.SEEK_SET)
+            sent = os.sendfile(dst_fd, src_fd, position, size)
+        if not sent:
+            break
+        copied += sent
+    return copied
+
+def _fsync_dir(path):
+    """fsync a directory so that renames in it are durable"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _set_io_priority(ioprio):
+    """
+    set the I/O priority of the calling thread with the ioprio_set syscall, return the previous priority,
+    or None where the syscall is not available
+    """
+    numbers = IOPRIO_SYSCALLS.get(platform.machine())
+    if ioprio is None or not numbers: return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        previous = libc.syscall(numbers[1], IOPRIO_WHO_PROCESS, 0)
+        if previous < 0 or libc.syscall(numbers[0], IOPRIO_WHO_PROCESS, 0, ioprio) < 0: return None
+        return previous
+    except (OSError, AttributeError):
+        return None
+
+class _ProgressReader:
+    """file wrapper reporting the bytes read through it to a progress function"""
+    def __init__(self, file, progress):
+        self.file = file
+        self.progress = progress
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.progress(len(data))
+        return data
+
+def _mount_points(root='/'):
+    """return the set of mount points listed in /proc/self/mountinfo"""
+    return {_unescape(line.split()[4]) for line in (_read(f'{root}proc/self/mountinfo', '') or '').splitlines() if len(line.split()) > 4}
+
+def _block_filesystems(root='/'):
+    """return the filesystem types the kernel can mount from a block device, from /proc/filesystems"""
+    return [line.strip() for line in (_read(f'{root}proc/filesystems', '') or '').splitlines() if line.strip() and not line.startswith('nodev')]
+
+def _libc_call(name, *args):
+    """call a libc function that returns -1 and sets errno on failure, raising OSError for the path given first"""
+    libc = ctypes.CDLL(None, use_errno=True)
+    if getattr(libc, name)(*args) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err), args[0].decode())
+
+class USB_Watcher:
+    '''
+    USB_Watcher Class calls callback(event, device) with event 'add' or 'remove' and a USB_SD object whenever
+    a block storage device appears or disappears, or 'error' when a new device could not be mounted. It waits on the kernel uevent netlink socket and compares
+    get_device_attrs() on block events, falling back to polling every poll_interval seconds when netlink is
+    not available (or root points to a fake filesystem tree).
+    '''
+    def __init__(self, callback, mount=False, root='/', poll_interval=1, use_netlink=True, report_existing=True):
+        self.callback = callback
+        self.mount = mount
+        self.root = root
+        self.poll_interval = poll_interval
+        self.use_netlink = use_netlink and root == '/'
+        self.report_existing = report_existing
+        self.devices = {}
+        self.status = False
+        self.thread = None
+
+    def start(self):
+        '''
+        Start watching in a background thread
+        '''
+        self.status = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        '''
+        Stop watching and wait for the background thread to end
+        '''
+        self.status = False
+        if self.thread: self.thread.join()
+
+    def _open_netlink(self):
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, 1)) # multicast group 1: kernel uevents
+            return sock
+        except (OSError, AttributeError) as e:
+            print(f'uevent netlink socket unavailable ({e}), polling every {self.poll_interval}s')
+            return None
+
+    @staticmethod
+    def _is_storage_uevent(message):
+        '''
+        Return True if a raw uevent message concerns an sd* block device
+        '''
+        env = dict(field.split('=', 1) for field in message.decode(errors='replace').split('\0') if '=' in field)
+        return env.get('SUBSYSTEM') == 'block' and env.get('DEVNAME', '').split('/')[-1].startswith('sd')
+
+    def _run(self):
+        sock = self._open_netlink() if self.use_netlink else None
+        if not self.report_existing:
+            self.devices = {attrs['loc']: USB_SD(attrs=attrs) for attrs in get_device_attrs(self.root)}
+        self.check()
+
+        try:
+            while self.status:
+                if sock is None:
+                    time.sleep(self.poll_interval)
+                    self.check()
+                    continue
+                readable, _, _ = select.select([sock], [], [], self.poll_interval)
+                if readable and self._is_storage_uevent(sock.recv(65536)):
+                    self.check()
+        finally:
+            if sock: sock.close()
+
+    def check(self):
+        '''
+        Compare the current devices with the known ones and report the differences to the callback
+        '''
+        current = {attrs['loc']: attrs for attrs in get_device_attrs(self.root)}
 
-    return storage_devices
+        for loc in [loc for loc in self.devices if loc not in current]:
+            self._report('remove', self.devices.pop(loc))
+
+        for loc, attrs in current.items():
+            if loc in self.devices:
+                self.devices[loc].attrs.update(attrs) # udev links and mounts may show up after the add event
+                continue
+            try:
+                self.devices[loc] = USB_SD(attrs=attrs, mount=self.mount)
+            except Exception as e:
+                print(f'USB_Watcher failed to set up {loc}: {e}')
+                self.devices[loc] = USB_SD(attrs=attrs)
+                self._report('error', self.devices[loc])
+                continue
+            self._report('add', self.devices[loc])
+
+    def _report(self, event, device):
+        try:
+            self.callback(event, device)
+        except Exception as e:
+            print(f'USB_Watcher callback failed on {event} {device.loc}: {e}')
 
 class USB_SD:
     '''
-    USB_SD Class takes  a dictionary of device attributes obtained from the linux-based
-    command line utility blkid as  a string, and is passed through as a dictionary
-    {'loc':'/dev/<dev interface>', ...}. This class has methods for mounting,
+    USB_SD Class takes  a dictionary of device attributes obtained from sysfs by get_device_attrs(),
+    and is passed through as a dictionary {'loc':'/dev/<dev interface>', ...}. This class has methods for mounting,
     transfering files and unmounting on block usb storage device. Primarily made for the Raspberry pi,
     but can esentially work for any Debian based OS.
     '''
@@ -32,9 +308,24 @@ class USB_SD:
         self.loc = attrs['loc']
         self.dev_name = attrs['loc'].split("/")[-1]
         self.mnt = f'{mnt_base_dir}{self.dev_name}'
+        self._mounted_here = False
         if mount:
             self.mnt_usb()
-            time.sleep(5)
+
+    def __enter__(self):
+        '''
+        Mount the storage device if it is not mounted yet, it is unmounted again when the block exits
+        '''
+        if not self.is_mounted():
+            self.mnt_usb()
+            self._mounted_here = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._mounted_here:
+            self._mounted_here = False
+            self.umnt_usb()
+        return False
 
     def __call__(self, data_file, fldr_name=None):
         '''
@@ -45,34 +336,250 @@ class USB_SD:
         if not os.path.isdir(transfer_dir): os.system(f'sudo mkdir {transfer_dir}')
         os.system(f'sudo cp {data_file} {transfer_dir+filename}')
 
-    def mnt_usb(self):
+    def sync(self, src_dir, fldr_name=None, chunk_size=8 << 20, checksum=True, manifest_every=100, manifest_interval=10):
+        '''
+        Incrementally copy the files of src_dir (e.g. a csv_handler base_dir) into fldr_name located in self.mnt
+        directory. A manifest of the exported files (size, mtime, checksum) is kept next to them, so only new or
+        changed files are copied. Files are copied inside the kernel in chunk_size pieces into a .part file that
+        is resumed after an interruption, fsynced and renamed into place before being recorded in the manifest.
+        The manifest is saved every manifest_every copied files or manifest_interval seconds and at the end; files
+        copied after the last save are copied again by the next sync.
+        Return a dictionary with the number of files copied and skipped, bytes copied, duration and throughput.
+        '''
+        transfer_dir = f'{self.mnt}/{fldr_name}/' if fldr_name else f'{self.mnt}/pi_data/'
+        os.makedirs(transfer_dir, exist_ok=True)
+        manifest_file = transfer_dir + SYNC_MANIFEST
+        try:
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+
+        stats = {'copied': 0, 'skipped': 0, 'bytes': 0}
+        start = last_save = time.monotonic()
+        unsaved = 0
+
+        for dir_path, dir_names, file_names in os.walk(src_dir):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                if file_name.endswith(('.part', '.tmp')): continue # files still being written by csv_handler
+                src = os.path.join(dir_path, file_name)
+                rel_path = os.path.relpath(src, src_dir)
+                dst = os.path.join(transfer_dir, rel_path)
+                try:
+                    src_stats = os.stat(src)
+
+                    entry = manifest.get(rel_path)
+                    if entry and entry['size'] == src_stats.st_size and entry['mtime'] == src_stats.st_mtime and os.path.isfile(dst) and os.path.getsize(dst) == entry['size']:
+                        stats['skipped'] += 1
+                        continue
+
+                    copied = self._copy_file(src, dst, src_stats.st_size, chunk_size)
+                    file_checksum = _file_checksum(src) if checksum else None
+                except FileNotFoundError:
+                    continue # removed while syncing, e.g. replaced by its compressed version, picked up by the next sync
+
+                stats['bytes'] += copied
+                stats['copied'] += 1
+                manifest[rel_path] = {'size': src_stats.st_size, 'mtime': src_stats.st_mtime, 'checksum': file_checksum}
+                unsaved += 1
+                if unsaved >= manifest_every or time.monotonic() - last_save >= manifest_interval:
+                    self._save_manifest(manifest_file, manifest)
+                    last_save, unsaved = time.monotonic(), 0
+
+        if unsaved: self._save_manifest(manifest_file, manifest)
+        stats['seconds'] = time.monotonic() - start
+        stats['MB/s'] = stats['bytes'] / 1e6 / stats['seconds'] if stats['seconds'] else 0
+        print(f"{self.loc}: synced {src_dir} to {transfer_dir}, {stats['copied']} files copied ({stats['bytes']} bytes, {stats['MB/s']:.1f} MB/s), {stats['skipped']} unchanged")
+        return stats
+
+    @staticmethod
+    def _copy_file(src, dst, size, chunk_size):
+        '''
+        Copy the first size bytes of src to dst through dst.part, resuming a .part left by an interrupted copy
+        '''
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        part = dst + '.part'
+        src_fd = os.open(src, os.O_RDONLY)
+        try:
+            dst_fd = os.open(part, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                part_stats = os.fstat(dst_fd)
+                offset = part_stats.st_size
+                if offset > size or os.fstat(src_fd).st_mtime > part_stats.st_mtime: # source changed since, start over
+                    os.ftruncate(dst_fd, 0)
+                    offset = 0
+                copied = _copy_range(src_fd, dst_fd, offset, size - offset, chunk_size)
+                os.fsync(dst_fd)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+
+        os.replace(part, dst)
+        _fsync_dir(os.path.dirname(dst))
+        return copied
+
+    @staticmethod
+    def _save_manifest(manifest_file, manifest):
         '''
-        Mount storage device
+        Atomically and durably write the sync manifest
         '''
-        if not os.path.isdir(self.mnt): os.system(f'sudo mkdir {self.mnt}')
-        os.system(f'sudo mount {self.loc} {self.mnt}')
+        with open(manifest_file + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(manifest_file + '.tmp', manifest_file)
 
+    def export_archive(self, src_dir, fldr_name=None, archive_name=None, compression='gz', progress=None, idle_io=True, bufsize=1 << 20):
+        '''
+        Stream src_dir as a compressed tar ('gz', 'zst' if the zstandard package is installed, or None) directly into
+        fldr_name located in self.mnt directory, without staging a copy on the SD card. The archive is produced on the
+        fly through a bufsize buffer, written as a .part file, fsynced and renamed into place. With idle_io the calling
+        thread only gets disk time when no other process needs it, so control loops are not disturbed.
+        progress(bytes_done, bytes_total) is called as source data is read. Return the path of the archive.
+        '''
+        if compression == 'zst' and not zstandard: raise ImportError('zst archives require the zstandard package')
+        if compression not in (None, 'gz', 'zst'): raise ValueError(f'unsupported compression: {compression}')
+
+        transfer_dir = f'{self.mnt}/{fldr_name}/' if fldr_name else f'{self.mnt}/pi_data/'
+        os.makedirs(transfer_dir, exist_ok=True)
+        archive_name = archive_name or f"{os.path.basename(os.path.normpath(src_dir))}_{time.strftime('%Y%m%d%H%M%S')}"
+        archive = transfer_dir + archive_name + ('.tar' + (f'.{compression}' if compression else ''))
+
+        files = []
+        for dir_path, dir_names, file_names in os.walk(src_dir):
+            dir_names.sort()
+            files += [os.path.join(dir_path, name) for name in sorted(file_names) if not name.endswith(('.part', '.tmp'))]
+        total = 0
+        for file in files:
+            try:
+                total += os.path.getsize(file)
+            except FileNotFoundError:
+                pass
+        done = 0
+        exported = 0
+
+        def report(n):
+            nonlocal done
+            done += n
+            if progress: progress(done, total)
+
+        previous_ioprio = _set_io_priority(IOPRIO_CLASS_IDLE << 13 if idle_io else None)
+        try:
+            with open(archive + '.part', 'wb', buffering=bufsize) as dst:
+                writer = zstandard.ZstdCompressor().stream_writer(dst, closefd=False) if compression == 'zst' else dst
+                mode = 'w|gz' if compression == 'gz' else 'w|'
+                with tarfile.open(fileobj=writer, mode=mode, bufsize=bufsize) as tar:
+                    for file in files:
+                        try:
+                            tarinfo = tar.gettarinfo(file, arcname=os.path.relpath(file, src_dir))
+                            src = open(file, 'rb')
+                        except FileNotFoundError:
+                            continue # removed since the walk, e.g. replaced by its compressed version
+                        with src:
+                            tar.addfile(tarinfo, _ProgressReader(src, report))
+                        exported += 1
+                if writer is not dst: writer.close()
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(archive + '.part', archive)
+            _fsync_dir(transfer_dir)
+        except BaseException:
+            try:
+                os.remove(archive + '.part')
+            except FileNotFoundError:
+                pass
+            raise
+        finally:
+            if previous_ioprio is not None: _set_io_priority(previous_ioprio)
+
+        print(f'{self.loc}: exported {exported} files ({total} bytes) from {src_dir} to {archive}')
+        return archive
+
+    def is_mounted(self):
+        '''
+        Return True if self.mnt is listed in /proc/self/mountinfo
+        '''
+        return os.path.realpath(self.mnt) in _mount_points()
+
+    def _wait_mount(self, mounted, timeout, interval=0.01):
+        '''
+        Poll /proc/self/mountinfo until the mount point is (un)mounted, raise TimeoutError after timeout seconds
+        '''
+        deadline = time.monotonic() + timeout
+        while self.is_mounted() != mounted:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'{self.mnt} still {"not " if mounted else ""}mounted after {timeout}s')
+            time.sleep(interval)
+
+    def mnt_usb(self, read_only=False, sync=False, flush=False, timeout=5):
+        '''
+        Mount storage device and wait until the mount is listed in /proc/self/mountinfo. read_only mounts it read-only,
+        sync makes every write synchronous, flush (vfat) writes data back early so that a stick pulled out early
+        loses less. Filesystems without owners (FAT, exFAT, NTFS) are mounted for the calling user so that data
+        can be copied without sudo. Raise OSError or subprocess.CalledProcessError when mounting fails.
+        '''
+        if self.is_mounted(): return self.mnt
+
+        fstype = self.attrs.get('TYPE')
+        options = []
+        if flush: options.append('flush')
+        if fstype in UID_MOUNT_FILESYSTEMS: options += [f'uid={os.getuid()}', f'gid={os.getgid()}']
+
+        if os.geteuid() == 0:
+            os.makedirs(self.mnt, exist_ok=True)
+            flags = (MS_RDONLY if read_only else 0) | (MS_SYNCHRONOUS if sync else 0)
+            error = OSError(errno.ENODEV, 'no filesystem type to try', self.loc)
+            for candidate in [fstype] if fstype else _block_filesystems():
+                try:
+                    _libc_call('mount', self.loc.encode(), self.mnt.encode(), candidate.encode(), ctypes.c_ulong(flags), ','.join(options).encode() or None)
+                    break
+                except OSError as e:
+                    error = e
+                    if e.errno != errno.EINVAL: raise # EINVAL: not this filesystem type
+            else:
+                raise error
+        else:
+            if read_only: options.append('ro')
+            if sync: options.append('sync')
+            subprocess.run(['sudo', 'mkdir', '-p', self.mnt], check=True, capture_output=True)
+            subprocess.run(['sudo', 'mount'] + (['-o', ','.join(options)] if options else []) + [self.loc, self.mnt], check=True, capture_output=True)
+
+        self._wait_mount(True, timeout)
+        if not fstype: # unknown to udev, take the type the kernel detected
+            self.attrs['TYPE'] = _mounts().get(self.dev_name, (None, None))[1]
+            if self.attrs['TYPE'] in UID_MOUNT_FILESYSTEMS and os.geteuid() != 0: # mount again for the calling user
+                self.umnt_usb(timeout)
+                return self.mnt_usb(read_only, sync, flush, timeout)
         return self.mnt
 
-    def umnt_usb(self):
+    def umnt_usb(self, timeout=5):
         '''
-        Unmount storage device
+        Unmount storage device, wait until it is gone from /proc/self/mountinfo and remove the mount point.
+        Raise OSError or subprocess.CalledProcessError when unmounting fails.
         '''
         if not os.path.isdir(self.mnt):
             print(f'{self.mnt}: no mount point exists')
             return None
-        os.system(f'sudo umount {self.mnt}')
-        os.system(f'sudo rm -d {self.mnt}')
+
+        if os.geteuid() == 0:
+            if self.is_mounted(): _libc_call('umount2', self.mnt.encode(), 0)
+            self._wait_mount(False, timeout)
+            os.rmdir(self.mnt)
+        else:
+            if self.is_mounted(): subprocess.run(['sudo', 'umount', self.mnt], check=True, capture_output=True)
+            self._wait_mount(False, timeout)
+            subprocess.run(['sudo', 'rm', '-d', self.mnt], check=True, capture_output=True)
 
         return True
 
 if __name__ == '__main__':
 
-    storage_devices = get_devices(True)
+    storage_devices = get_devices()
     print(storage_devices)
     for dev in storage_devices:
-        dev('test.txt')
-        time.sleep(5)
-        os.system(f'sudo ls {dev.mnt}')
-        dev.umnt_usb()
+        with dev:
+            dev('test.txt')
+            os.system(f'sudo ls {dev.mnt}')
         os.system(f'sudo ls /mnt')
@@ -153,16 +153,7 @@ class DFRobot_BME280(object):
           @return Return temperature measurements, unit: °C
         '''
         data = self._read_reg(BME280_TEMP_DATA_MSB, 3)
-        raw = data[0] << 12 | data[1] << 4 | (data[2] & 0x0F)
-
-        # datasheet, Trimming Coefficient listing in register map with size and sign attributes
-        t1, t2, t3, p1, p2, p3, p4, p5, p6, p7, p8, p9, h1, h2, h3, h4, h5, h6 = self._data_calib
-
-        v1 = ((((raw >> 3) - (t1 << 1))) * t2) >> 11
-        v2 = (((((raw >> 4) - t1) * ((raw >> 4) - t1)) >> 12) * t3) >> 14
-        self._t_fine = v1 + v2
-        rslt = (self._t_fine * 5 + 128) >> 8
-        return (float(rslt) / 100)   # round((rslt / 100), 2)
+        return self._compensate_temperature(self._raw_20bit(data))
 
     @property
     def get_pressure(self):
@@ -173,12 +164,91 @@ class DFRobot_BME280(object):
           @n         position pressure is calculated according to the calibrated sea level atmospheric pressure
         '''
         data = self._read_reg(BME280_PRESS_DATA_MSB, 3)
-        raw = data[0] << 12 | data[1] << 4 | (data[2] & 0x0F)
+        self.get_temperature   # update _t_fine
+        return self._compensate_pressure(self._raw_20bit(data))
+
+    @property
+    def get_humidity(self):
+        '''!
+          @brief Get humidity measurement value from register, working range (0 ~ 100 %RH)
+          @return Return humidity measurements, unit: %RH
+        '''
+        data = self._read_reg(BME280_HUM_DATA_MSB, 2)
+        self.get_temperature   # update _t_fine
+        return self._compensate_humidity(data[0] << 8 | data[1])
 
+    @property
+    def get_altitude(self):
+        '''!
+          @brief Calculate the altitude based on the atmospheric pressure measured by the sensor
+          @return Return altitude, unit: m
+          @attention If the reference value is provided before, the absolute value of the current
+          @n         position pressure is calculated according to the calibrated sea level atmospheric pressure
+        '''
+        return self.calc_altitude(self.get_pressure)
+
+    def read_all(self):
+        '''!
+          @brief Read pressure, temperature and humidity with one burst read of the data registers (0xF7 ~ 0xFE),
+          @n     so all three come from the same conversion
+          @return Return (temperature in °C, pressure in Pa, humidity in %RH)
+        '''
+        return self.compensate(self.read_data())
+
+    def read_data(self):
+        '''!
+          @brief Burst read the raw pressure, temperature and humidity data registers (0xF7 ~ 0xFE)
+          @return Return the 8 bytes read
+        '''
+        return self._read_reg(BME280_PRESS_DATA_MSB, 8)
+
+    def compensate(self, data):
+        '''!
+          @brief Compensate a burst read of the data registers (0xF7 ~ 0xFE)
+          @param data the 8 bytes read from 0xF7
+          @return Return (temperature in °C, pressure in Pa, humidity in %RH)
+        '''
+        temperature = self._compensate_temperature(self._raw_20bit(data[3:6]))
+        pressure = self._compensate_pressure(self._raw_20bit(data[0:3]))
+        humidity = self._compensate_humidity(data[6] << 8 | data[7])
+        return temperature, pressure, humidity
+
+    def calc_altitude(self, pressure):
+        '''!
+          @brief Calculate the altitude of a pressure, relative to the sea level pressure
+          @param pressure pressure in Pa
+          @return Return altitude, unit: m
+        '''
+        # see https://www.weather.gov/media/epz/wxcalc/pressureAltitude.pdf
+        return 44307.7 * (1 - (pressure / self.sea_level_pressure) ** 0.190284)
+
+    @staticmethod
+    def _raw_20bit(data):
+        '''!
+          @brief Combine the msb, lsb and xlsb[7:4] registers of a pressure or temperature reading
+        '''
+        return data[0] << 12 | data[1] << 4 | (data[2] >> 4)
+
+    def _compensate_temperature(self, raw):
+        '''!
+          @brief Compensate a raw temperature reading, updating _t_fine for pressure and humidity
+          @return Return temperature, unit: °C
+        '''
         # datasheet, Trimming Coefficient listing in register map with size and sign attributes
         t1, t2, t3, p1, p2, p3, p4, p5, p6, p7, p8, p9, h1, h2, h3, h4, h5, h6 = self._data_calib
 
-        self.get_temperature   # update _t_fine
+        v1 = ((((raw >> 3) - (t1 << 1))) * t2) >> 11
+        v2 = (((((raw >> 4) - t1) * ((raw >> 4) - t1)) >> 12) * t3) >> 14
+        self._t_fine = v1 + v2
+        rslt = (self._t_fine * 5 + 128) >> 8
+        return (float(rslt) / 100)   # round((rslt / 100), 2)
+
+    def _compensate_pressure(self, raw):
+        '''!
+          @brief Compensate a raw pressure reading with the _t_fine of its temperature reading
+          @return Return pressure, unit: Pa
+        '''
+        t1, t2, t3, p1, p2, p3, p4, p5, p6, p7, p8, p9, h1, h2, h3, h4, h5, h6 = self._data_calib
 
         v1 = self._t_fine - 128000
         v2 = v1 * v1 * p6
@@ -195,20 +265,13 @@ class DFRobot_BME280(object):
         rslt = ((int(rslt) + v1 + v2) >> 8) + (p7 << 4)
         return (float(rslt) / 256)
 
-    @property
-    def get_humidity(self):
+    def _compensate_humidity(self, raw):
         '''!
-          @brief Get humidity measurement value from register, working range (0 ~ 100 %RH)
-          @return Return humidity measurements, unit: %RH
+          @brief Compensate a raw humidity reading with the _t_fine of its temperature reading
+          @return Return humidity, unit: %RH
         '''
-        data = self._read_reg(BME280_HUM_DATA_MSB, 2)
-        raw = data[0] << 8 | data[1]
-
-        # datasheet, Trimming Coefficient listing in register map with size and sign attributes
         t1, t2, t3, p1, p2, p3, p4, p5, p6, p7, p8, p9, h1, h2, h3, h4, h5, h6 = self._data_calib
 
-        self.get_temperature   # update _t_fine
-
         v1 = self._t_fine - 76800
         v1 = (((((raw <<14) - (h4 << 20) - (h5 * v1)) + 16384) >> 15) * (((((((v1 * h6) >> 10) *
              (((v1 * h3) >> 11) + 32768)) >> 10) + 2097152) * h2 + 8192) >> 14))
@@ -219,17 +282,6 @@ class DFRobot_BME280(object):
             v1 = 419430400
         return (v1 >> 12) / 1024.0
 
-    @property
-    def get_altitude(self):
-        '''!
-          @brief Calculate the altitude based on the atmospheric pressure measured by the sensor
-          @return Return altitude, unit: m
-          @attention If the reference value is provided before, the absolute value of the current
-          @n         position pressure is calculated according to the calibrated sea level atmospheric pressure
-        '''
-        # see https://www.weather.gov/media/epz/wxcalc/pressureAltitude.pdf
-        return 44307.7 * (1 - (self.get_pressure / self.sea_level_pressure) ** 0.190284)
-
     @property
     def get_data_ready_status(self):
         '''!
@@ -477,31 +529,50 @@ class DFRobot_BME280_I2C(DFRobot_BME280):
         return self._i2c.read_i2c_block_data(self._addr, reg, length)
 
 
+## BCM pins of the hardware chip selects of the SPI devices, by (bus, device)
+SPI_HARDWARE_CS = {(0, 0): 8, (0, 1): 7}
+
+
 class DFRobot_BME280_SPI(DFRobot_BME280):
     '''!
       @brief define DFRobot_BME280_SPI base class
-      @details for using SPI protocol to drive the pressure sensor
+      @details for using SPI protocol to drive the pressure sensor. Every register read or write is a single
+      @n       full-duplex transfer, with the hardware chip select when cs is the chip select pin of the device
     '''
 
     def __init__(self, cs=8, bus=0, dev=0, speed=500000):
         '''!
           @brief Module SPI communication init
-          @param cs cs chip select pin
+          @param cs cs chip select pin, driven by the SPI controller if it is the hardware chip select of bus and dev
           @param bus SPI bus
           @param dev SPI device number
           @param speed SPI communication frequency
         '''
-        self._cs = cs
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
-        GPIO.setup(self._cs, GPIO.OUT, initial=1)
-        GPIO.output(self._cs, GPIO.LOW)
+        self._cs = None if SPI_HARDWARE_CS.get((bus, dev)) == cs else cs
         self._spi = spidev.SpiDev()
         self._spi.open(bus, dev)
-        self._spi.no_cs = True
+        if self._cs is not None:
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setwarnings(False)
+            GPIO.setup(self._cs, GPIO.OUT, initial=1)
+            self._spi.no_cs = True
         self._spi.max_speed_hz = speed
         super(DFRobot_BME280_SPI, self).__init__()
 
+    def _xfer(self, data):
+        '''!
+          @brief one full-duplex transfer with chip select held low
+          @param data bytes sent
+          @return bytes received
+        '''
+        if self._cs is None:
+            return self._spi.xfer2(data)
+        GPIO.output(self._cs, GPIO.LOW)
+        try:
+            return self._spi.xfer2(data)
+        finally:
+            GPIO.output(self._cs, GPIO.HIGH)
+
     def _write_reg(self, reg, data):
         '''!
           @brief writes data to a register
@@ -511,11 +582,11 @@ class DFRobot_BME280_SPI(DFRobot_BME280):
         if isinstance(data, int):
             data = [data]
             #logger.info(data)
-        reg_addr = [reg & 0x7f]
-        GPIO.output(self._cs, GPIO.LOW)
-        self._spi.xfer(reg_addr)
-        self._spi.xfer(data)
-        GPIO.output(self._cs, GPIO.HIGH)
+        # SPI writes do not auto-increment, every byte is preceded by its register address
+        frame = []
+        for i, value in enumerate(data):
+            frame += [(reg + i) & 0x7f, value]
+        self._xfer(frame)
 
     def _read_reg(self, reg, length):
         '''!
@@ -524,12 +595,4 @@ class DFRobot_BME280_SPI(DFRobot_BME280):
           @param length read data length
           @return read data list
         '''
-        reg_addr = [reg | 0x80]
-        GPIO.output(self._cs, GPIO.LOW)
-        #logger.info(reg_addr)
-        self._spi.xfer(reg_addr)
-        time.sleep(0.01)
-        # self._spi.readbytes(1)
-        rslt = self._spi.readbytes(length)
-        GPIO.output(self._cs, GPIO.HIGH)
-        return rslt
+        return self._xfer([reg | 0x80] + [0] * length)[1:]
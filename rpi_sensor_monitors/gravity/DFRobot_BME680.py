@@ -211,6 +211,13 @@ _BME680_RUN_GAS_POS = 4
 _BME680_MODE_POS = 0
 _BME680_NBCONV_POS = 0
 
+# Measurement cycles of each oversampling setting, and their timing in microseconds
+_BME680_OS_MEAS_CYCLES = [0, 1, 2, 4, 8, 16]
+_BME680_MEAS_CYCLE_US = 1963
+_BME680_TPH_SWITCH_US = 477 * 4
+_BME680_GAS_MEAS_US = 477 * 5
+_BME680_WAKE_UP_MS = 1
+
 # Look up tables for the possible gas range values
 lookupTable1 = [2147483647, 2147483647, 2147483647, 2147483647,
         2147483647, 2126008810, 2147483647, 2130303777, 2147483647,
@@ -355,6 +362,8 @@ class GasSettings:
         self.heatr_temp = None
         # Pointer to store duration profile
         self.heatr_dur = None
+        # Heater duration of each profile in milliseconds
+        self.heatr_durs = {}
 
 # BME680 device structure
 
@@ -422,6 +431,7 @@ class DFRobot_BME680(BME680Data):
 
         self.i2c_addr = i2c_addr
         self._i2c = i2c_device
+        self._ready_at = 0
         if self._i2c is None:
             import smbus
             self._i2c = smbus.SMBus(1)
@@ -566,6 +576,7 @@ class DFRobot_BME680(BME680Data):
             raise ValueError("Profile '{}' should be between {} and {}".format(nb_profile, _BME680_NBCONV_MIN, _BME680_NBCONV_MAX))
 
         self.gas_settings.heatr_dur = value
+        self.gas_settings.heatr_durs[nb_profile] = value
         temp = self._calc_heater_duration(self.gas_settings.heatr_dur)
         self._set_regs(_BME680_GAS_WAIT0_ADDR + nb_profile, temp)
 
@@ -582,44 +593,79 @@ class DFRobot_BME680(BME680Data):
         self.power_mode = self._get_regs(_BME680_CONF_T_P_MODE_ADDR, 1)
         return self.power_mode
 
-    def get_sensor_data(self):
-        self.set_power_mode(self.FORCED_MODE)
+    def get_measurement_duration(self):
+        '''!
+          @brief Duration in seconds of a forced mode measurement with the current settings: the oversampled
+          @n temperature, pressure and humidity conversions, and the heating of the selected gas heater profile
+          @n when gas measurement is enabled. The IIR filter is applied by the sensor and takes no extra time.
+        '''
+        settings = self.tph_settings
+        meas_cycles = sum(_BME680_OS_MEAS_CYCLES[os or 0] for os in (settings.os_temp, settings.os_pres, settings.os_hum))
+        tph_dur = meas_cycles * _BME680_MEAS_CYCLE_US + _BME680_TPH_SWITCH_US + _BME680_GAS_MEAS_US
+        duration = (tph_dur + 500) // 1000 + _BME680_WAKE_UP_MS
 
-        for attempt in range(10):
-            status = self._get_regs(_BME680_FIELD0_ADDR, 1)
+        if self.gas_settings.run_gas:
+            duration += self.gas_settings.heatr_durs.get(self.gas_settings.nb_conv or 0, 0)
 
-            if (status & _BME680_NEW_DATA_MSK) == 0:
-                time.sleep(0.01)
-                continue
+        return duration / 1000.0
 
+    def trigger(self):
+        '''!
+          @brief Start a forced mode measurement without waiting for it
+          @return the time in seconds until the measurement is expected to be ready
+        '''
+        self.set_power_mode(self.FORCED_MODE)
+        duration = self.get_measurement_duration()
+        self._ready_at = time.monotonic() + duration
+        return duration
+
+    def collect(self, poll_timeout=0.05, poll_interval=0.002):
+        '''!
+          @brief Wait for the measurement started by trigger() and read it into data
+          @n Sleeps once until the measurement is expected to be ready, then polls for new data for up to poll_timeout seconds
+          @return True if new data was read, False otherwise
+        '''
+        delay = self._ready_at - time.monotonic()
+        if delay > 0: time.sleep(delay)
+
+        deadline = time.monotonic() + poll_timeout
+        while True:
             regs = self._get_regs(_BME680_FIELD0_ADDR, _BME680_FIELD_LENGTH)
+            if regs[0] & _BME680_NEW_DATA_MSK:
+                self._parse_field_data(regs)
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
 
-            self.data.status = regs[0] & _BME680_NEW_DATA_MSK
-            # Contains the nb_profile used to obtain the current measurement
-            self.data.gas_index = regs[0] & _BME680_GAS_INDEX_MSK
-            self.data.meas_index = regs[1]
+    def get_sensor_data(self):
+        self.trigger()
+        return self.collect()
 
-            adc_pres = (regs[2] << 12) | (regs[3] << 4) | (regs[4] >> 4)
-            adc_temp = (regs[5] << 12) | (regs[6] << 4) | (regs[7] >> 4)
-            adc_hum = (regs[8] << 8) | regs[9]
-            adc_gas_res = (regs[13] << 2) | (regs[14] >> 6)
-            gas_range = regs[14] & _BME680_GAS_RANGE_MSK
+    def _parse_field_data(self, regs):
+        self.data.status = regs[0] & _BME680_NEW_DATA_MSK
+        # Contains the nb_profile used to obtain the current measurement
+        self.data.gas_index = regs[0] & _BME680_GAS_INDEX_MSK
+        self.data.meas_index = regs[1]
 
-            self.data.status |= regs[14] & _BME680_GASM_VALID_MSK
-            self.data.status |= regs[14] & _BME680_HEAT_STAB_MSK
+        adc_pres = (regs[2] << 12) | (regs[3] << 4) | (regs[4] >> 4)
+        adc_temp = (regs[5] << 12) | (regs[6] << 4) | (regs[7] >> 4)
+        adc_hum = (regs[8] << 8) | regs[9]
+        adc_gas_res = (regs[13] << 2) | (regs[14] >> 6)
+        gas_range = regs[14] & _BME680_GAS_RANGE_MSK
 
-            self.data.heat_stable = (self.data.status & _BME680_HEAT_STAB_MSK) > 0
+        self.data.status |= regs[14] & _BME680_GASM_VALID_MSK
+        self.data.status |= regs[14] & _BME680_HEAT_STAB_MSK
 
-            temperature = self._calc_temperature(adc_temp)
-            self.data.temperature = temperature / 100.0
-            self.ambient_temperature = temperature # Saved for heater calc
+        self.data.heat_stable = (self.data.status & _BME680_HEAT_STAB_MSK) > 0
 
-            self.data.pressure = self._calc_pressure(adc_pres) / 100.0
-            self.data.humidity = self._calc_humidity(adc_hum) / 1000.0
-            self.data.gas_resistance = self._calc_gas_resistance(adc_gas_res, gas_range)
-            return True
+        temperature = self._calc_temperature(adc_temp)
+        self.data.temperature = temperature / 100.0
+        self.ambient_temperature = temperature # Saved for heater calc
 
-        return False
+        self.data.pressure = self._calc_pressure(adc_pres) / 100.0
+        self.data.humidity = self._calc_humidity(adc_hum) / 1000.0
+        self.data.gas_resistance = self._calc_gas_resistance(adc_gas_res, gas_range)
 
     def _set_bits(self, register, mask, position, value):
         temp = self._get_regs(register, 1)
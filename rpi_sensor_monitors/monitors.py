@@ -1,15 +1,31 @@
 import json
+import heapq
+import itertools
 import threading
+import concurrent.futures
+import collections
+import selectors
 import datetime
 import time
 import os
 import os.path
 import sys
+import shlex
+import signal
+import subprocess
 from .gravity import DFRobot_BME680, DFRobot_BME280
+from rpi_control_center.data import retention_policy
 import posix
 from fcntl import ioctl
 import RPi.GPIO as GPIO
+import pigpio
 import serial
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
 
 timestamp_strformat = '%Y/%m/%d %H:%M:%S'
 
@@ -65,152 +81,251 @@ def initiate_file(dir, filename):
 
 ######################################################################## Classes
 
-class BME680():
+class SensorScheduler():
+    """
+    A class that runs the readings of many sensor monitors off a single timer heap. Each monitor is due every
+    refresh_rate seconds; due readings are handed to a small worker pool so a blocking read does not delay the
+    others, and a monitor whose previous reading is still running skips that period. Adding a monitor again
+    replaces its entry, older entries are dropped by their generation.
+    ----------
+    max_workers : int
+        number of worker threads executing readings
+    thread : threading.thread
+        timer thread, running while at least one monitor is scheduled
+
+    Methods
+    -------
+    add(monitor, delay=0):
+        schedule monitor.sample() every monitor.refresh_rate seconds, starting after delay seconds
+    submit(func, *args):
+        run func on the worker pool
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.thread = None
+        self._heap = []
+        self._order = itertools.count()
+        self._generations = {}
+        self._cond = threading.Condition()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sensor')
+
+    def add(self, monitor, delay=0):
+        with self._cond:
+            generation = self._generations[monitor] = self._generations.get(monitor, 0) + 1
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._order), generation, monitor))
+            if self.thread is None: # cleared by _run under the lock when it exits
+                self.thread = threading.Thread(target=self._run, name='sensor-scheduler')
+                self.thread.start()
+            self._cond.notify()
+
+    def submit(self, func, *args):
+        return self._pool.submit(func, *args)
+
+    def _run(self):
+        with self._cond:
+            while self._heap:
+                due, order, generation, monitor = self._heap[0]
+                if generation != self._generations.get(monitor): # replaced by a later add, drop it
+                    heapq.heappop(self._heap)
+                    continue
+                if not monitor.status: # stopped, drop it
+                    heapq.heappop(self._heap)
+                    del self._generations[monitor]
+                    continue
+                now = time.monotonic()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+
+                heapq.heappop(self._heap)
+                if not monitor.busy:
+                    monitor.busy = True
+                    self._pool.submit(monitor.sample)
+                heapq.heappush(self._heap, (max(due + monitor.refresh_rate, now), order, generation, monitor))
+            self.thread = None
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """return the scheduler shared by all monitors that are not given their own"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None: _default_scheduler = SensorScheduler()
+        return _default_scheduler
+
+class SensorMonitor():
     """
-    A class to represents an Interface for reading Atlas Scientific Sensors
-    connected to rpi via i2c bus(uses AtlasI2C Class provided by Atlas Scientific).
-    This class supports non-blocking multi-process threading, for near-realtime
-    monitoring of reading of Atlas Scientific sensors connected on the I2Cbus
+    Base class of the sensor monitors. Subclasses implement read(), returning a dictionary of readings or raising
+    on failure, and optionally begin() and end() to set up and release the sensor. Readings are taken every
+    refresh_rate seconds by a SensorScheduler, shared by all monitors by default, and pushed to the api file
+    with the status and error of the monitor.
     ----------
     label : str
-        label given to the class of Atlas Scientific Sensors, name used for filing
+        label given to the sensor, name used for filing
     status : bool
         The status of the object, active or inactive
-    devices : list(DFRobot_BME680 obj)
-        the list of Atlas sensor objects initiated from the begin() function
     sensor_readings : dict()
-        dictionary of the latest readings of all sensors with respoective properties
+        latest readings of the sensor, None if the last reading failed
+    error : str
+        error of the last reading, None if it succeeded
+    error_count : int
+        number of failed readings since start
     api_file : str
         location of the api_file
     log_file : str
         location of the log_file
     refresh_rate : int
-        Refresh rate of state check
-    logger : logging.logger
-        logger object
+        Refresh rate of the readings in seconds
+    scheduler : SensorScheduler
+        scheduler taking the readings
     thread : threading.thread
-        thread object associated with the parallel process, when starting start() function is called
+        scheduler thread taking the readings
 
     Methods
     -------
-    set_thread(func):
-        Decorator Function in order to set the thread property of the object to
-        the output of a function returning  a thread object
     begin():
-        Initiates the device objects representing all Atlas Scientific Sensors
-        connected to the i2c bus. it also initiates the refreshrate.
-        call this before starting any process!
-    print_devices():
-        prints all Atlas devices connected to the i2c bus
+        set up the sensor, called on a worker thread when the monitor starts
+    read():
+        return a dictionary of readings of the sensor
+    end():
+        release the sensor, called on a worker thread when the monitor stops
     get_sensor_readings():
-        retrieves all sensor readings from the list of devices
-    @set_thread
-    @threaded
+        take a reading, recording the error if it fails
     start():
-        Return a thread and start the non-blocking parallel thread which is a driver for
-        getting the sensor readings and pushing to an api
+        set up the sensor and schedule the readings, non-blocking, returns a future of the set up
     stop():
-        set status to False, which in turn will end the while loop of the active thread
+        set status to False, take a last reading and release the sensor, non-blocking, returns a future.
+        Set ups and releases of a monitor run one after the other, in the order start() and stop() are called
     """
 
-    def __init__(self, label='BME680' , api_dir='./api/', log_dir='./log/',refresh_rate=1):
-        self._label = label
-        self._status = False
+    def __init__(self, label, api_dir='./api/', log_dir='./log/', refresh_rate=1, scheduler=None):
+        self.label = label
+        self.status = False
+        self.busy = False
+        self.sensor_readings = None
+        self.error = None
+        self.error_count = 0
+        self.api_file = initiate_file(api_dir, label+".json")
+        self.log_file = initiate_file(log_dir, label+"-process.log")
+        self.refresh_rate = refresh_rate
+        self.scheduler = scheduler
+        self.logger = None
+        self.thread = None
+        self._lock = threading.Lock()
+        self._transition = None
+        self._transition_lock = threading.Lock()
+
+    def begin(self):
+        pass
+
+    def read(self):
+        raise NotImplementedError()
+
+    def end(self):
+        pass
+
+    def get_sensor_readings(self):
+        try:
+            readings = self.read()
+            if readings is not None and 'timestamp' not in readings:
+                readings['timestamp'] = datetime.datetime.now().strftime(timestamp_strformat)
+            self.error = None
+        except Exception as e:
+            readings = None
+            self.error = f'{type(e).__name__}: {e}'
+            self.error_count += 1
+            print(f'error getting {self.label} readings: {self.error}')
+
+        self.sensor_readings = readings
+        return self.sensor_readings
+
+    def push_to_api(self):
+        push_to_api(self.api_file, {'label': self.label,
+                                    'status': self.status,
+                                    'sensor_data': self.sensor_readings,
+                                    'error': self.error,
+                                    'error_count': self.error_count})
+
+    def sample(self):
+        """take a reading and push it to the api file, called by the scheduler"""
+        try:
+            with self._lock:
+                if self.status:
+                    self.get_sensor_readings()
+                    self.push_to_api()
+        finally:
+            self.busy = False
+
+    def _begin(self):
+        try:
+            self.begin()
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+            self.error_count += 1
+            print(f'error setting up {self.label}: {self.error}')
+        if not self.status: return # stopped while setting up, _end follows
+        self.scheduler.add(self)
+        self.thread = self.scheduler.thread
+
+    def _end(self):
+        with self._lock:
+            self.get_sensor_readings()
+            self.push_to_api()
+            print(f'Stopping {self.label} thread processes in progress')
+            self.end()
+            print('Thread process ended')
+
+    @staticmethod
+    def _after(previous, func):
+        if previous: concurrent.futures.wait([previous])
+        return func()
+
+    def _submit_transition(self, func):
+        """run func on the worker pool once the previous start or stop of the monitor has completed"""
+        with self._transition_lock:
+            self._transition = self.scheduler.submit(self._after, self._transition, func)
+            return self._transition
+
+    def start(self):
+        self.scheduler = self.scheduler or get_scheduler()
+        self.status = True
+        print(f'Starting {self.label} process')
+        return self._submit_transition(self._begin)
+
+    def stop(self):
+        self.status = False
+        print(f'attempting to stop thread of {self.label}')
+        return self._submit_transition(self._end) if self.scheduler else None
+
+
+class BME680(SensorMonitor):
+    """
+    A class to represents an Interface for reading the DFRobot BME680 environmental sensor
+    connected to rpi via i2c bus(uses the DFRobot_BME680 driver).
+    Readings are scheduled by the SensorScheduler of the SensorMonitor base class
+    ----------
+    sensor : DFRobot_BME680
+        the sensor object initiated from the begin() function
+    heater_profiles : list
+        (temperature in C, duration in ms) of each gas heater profile, up to 10. Every reading takes one
+        measurement per profile back to back, publishing the gas resistance and heat stability of each
+
+    Methods
+    -------
+    begin():
+        Initiates and configures the sensor object. Called when the monitor starts
+    read():
+        retrieves the temperature, humidity, pressure and gas resistance readings of the sensor
+    """
+
+    def __init__(self, label='BME680' , api_dir='./api/', log_dir='./log/',refresh_rate=1, scheduler=None, heater_profiles=((320, 150),)):
+        super().__init__(label, api_dir, log_dir, refresh_rate, scheduler)
+        if not 1 <= len(heater_profiles) <= 10:
+            raise ValueError(f'1 to 10 heater profiles are supported, {len(heater_profiles)} given')
+        self.heater_profiles = list(heater_profiles)
         self.sensor = None
-        self._sensor_readings = None
-        self._api_file = initiate_file(api_dir,label+".json")
-        self._log_file = initiate_file(log_dir,label+"-process.log")
-        self._refresh_rate = refresh_rate
-        self._logger = None
-        self._thread = None
-
-    @property
-    def label(self):
-        """return the label of the object"""
-        return self._label
-
-    @label.setter
-    def label(self, value):
-        """set the label of the object"""
-        self._label = value
-
-    @property
-    def status(self):
-        """return the status of the object"""
-        return self._status
-
-    @status.setter
-    def status(self, value):
-        """set the status of the object"""
-        self._status = value
-
-    @property
-    def sensor_readings(self):
-        """return the sensor_readings of the object"""
-        return self._sensor_readings
-
-    @sensor_readings.setter
-    def sensor_readings(self, value):
-        """set the sensor_readings of the object"""
-        self._sensor_readings = value
-
-    @property
-    def api_file(self):
-        """return the api_file of the object"""
-        return self._api_file
-
-    @api_file.setter
-    def api_file(self, value):
-        """set the api_file of the object"""
-        self._api_file = value
-
-    @property
-    def log_file(self):
-        """return the log_file of the object"""
-        return self._log_file
-
-    @log_file.setter
-    def log_file(self, value):
-        """set the log_file of the object"""
-        self._log_file = value
-
-    @property
-    def refresh_rate(self):
-        """return the refresh_rate of the object"""
-        return self._refresh_rate
-
-    @refresh_rate.setter
-    def refresh_rate(self, value):
-        """set the refresh_rate of the object"""
-        self._refresh_rate = value
-
-    @property
-    def logger(self):
-        """return the logger of the object"""
-        return self._logger
-
-    @logger.setter
-    def logger(self, value):
-        """set the logger of the object"""
-        self._logger = value
-
-    @property
-    def thread(self):
-        """return the thread of the object"""
-        return self._thread
-
-    @thread.setter
-    def thread(self, value):
-        """set the thread of the object"""
-        self._thread = value
-
-    def set_thread(func):
-        """Decorator Function in order to set the thread property of the object to the output of a function returning  a thread object"""
-        def wrapper(self):
-            self.thread = func(self)
-            print(f'thread object for {self.label} set as {self.thread}')
-            return self.thread
-        return wrapper
 
     def begin(self):
         """"""
@@ -221,112 +336,303 @@ class BME680():
         sensor.set_filter(sensor.FILTER_SIZE_3) #increasing resolution but reducing bandwidth
 
         sensor.set_gas_status(sensor.ENABLE_GAS_MEAS) #1 for enable and 0 for disable
-        sensor.set_gas_heater_temperature(320) #value:target temperature in degrees celsius, between 200 ~ 400
-        sensor.set_gas_heater_duration(150) #value:target duration in milliseconds, between 1 and 4032
+        for nb_profile, (temperature, duration) in enumerate(self.heater_profiles):
+            sensor.set_gas_heater_profile(temperature, duration, nb_profile=nb_profile) #temperature between 200 ~ 400 C, duration between 1 and 4032 ms
         sensor.select_gas_heater_profile(0) #value:current gas sensor conversion profile: 0 to 9
 
         self.sensor = sensor
 
-    def get_sensor_readings(self):
+    def read(self):
+        readings = {}
+        single = len(self.heater_profiles) == 1
 
-        if self.sensor.get_sensor_data():
-            sensor_data = { 'Temperature,C':self.sensor.data.temperature,
-                            'Humidity,%RH': self.sensor.data.humidity,
-                            'Pressure,hPa': self.sensor.data.pressure,
-                            'timestamp': datetime.datetime.now().strftime(timestamp_strformat)
-                            }
+        for nb_profile in range(len(self.heater_profiles)):
+            if not single: self.sensor.select_gas_heater_profile(nb_profile)
+            self.sensor.trigger()
+            if not self.sensor.collect():
+                raise TimeoutError(f'measurement not ready (heater profile {nb_profile})')
 
-            self.sensor_readings = sensor_data
-        else:
-            self.sensor_readings = None
+            suffix = '' if single else f'_{nb_profile}'
+            readings[f'Gas resistance{suffix},Ohm'] = round(self.sensor.data.gas_resistance, 1)
+            readings[f'Heat stable{suffix}'] = self.sensor.data.heat_stable
 
-        return self.sensor_readings
+        readings.update({ 'Temperature,C':self.sensor.data.temperature,
+                          'Humidity,%RH': self.sensor.data.humidity,
+                          'Pressure,hPa': self.sensor.data.pressure,
+                          'timestamp': datetime.datetime.now().strftime(timestamp_strformat)
+                          })
+        return readings
 
-    @set_thread
-    @threaded
-    def start(self):
-        self.status = True
-        print(f'Starting {self.label} process')
-        data = {'label':self.label}
-        self.begin()
 
-        while self.status:
-            data['status'] = self.status 
-            data['sensor_data'] = self.get_sensor_readings()
-            push_to_api(self.api_file, data)
-            time.sleep(self.refresh_rate)
+class BME280(SensorMonitor):
+    """
+    Monitor of the DFRobot BME280 environmental sensor on i2c (BME280_SPI for SPI), running in normal mode.
+    The sensor converts every measurement period, its conversion time plus standby ms of standby, which is also
+    the default refresh_rate. A reading sleeps measurement_time through a conversion in progress rather than polling
+    the status register and, if the data registers have not changed since the last reading and no conversion was
+    seen, waits for the next one, then reads them in one burst, so every published sample is a new conversion.
+    ----------
+    sensor : DFRobot_BME280
+        the sensor object initiated from the begin() function
+    standby : float
+        standby time between conversions in ms: 0.5, 10, 20, 62.5, 125, 250, 500 or 1000
+    measurement_time : float
+        duration in seconds of a conversion with the oversampling set by the driver
+    """
+    STANDBY_TIMES = {0.5: DFRobot_BME280.BME280_CONFIG_STANDBY_TIME_0P5, 10: DFRobot_BME280.BME280_CONFIG_STANDBY_TIME_10,
+                     20: DFRobot_BME280.BME280_CONFIG_STANDBY_TIME_20, 62.5: DFRobot_BME280.BME280_CONFIG_STANDBY_TIME_62P5,
+                     125: DFRobot_BME280.BME280_CONFIG_STANDBY_TIME_125, 250: DFRobot_BME280.BME280_CONFIG_STANDBY_TIME_250,
+                     500: DFRobot_BME280.BME280_CONFIG_STANDBY_TIME_500, 1000: DFRobot_BME280.BME280_CONFIG_STANDBY_TIME_1000}
+    OVERSAMPLING = 4 # temperature, pressure and humidity oversampling set by DFRobot_BME280.begin()
+
+    def __init__(self, label='BME280', api_dir='./api/', log_dir='./log/', refresh_rate=None, scheduler=None, standby=125, i2c_addr=0x77, i2c_bus=1):
+        if standby not in self.STANDBY_TIMES:
+            raise ValueError(f'standby should be one of {sorted(self.STANDBY_TIMES)} ms')
+        self.standby = standby
+        # datasheet typical measurement time of temperature, pressure and humidity
+        self.measurement_time = (1.25 + 3 * 2.3 * self.OVERSAMPLING + 2 * 0.575) / 1000
+        super().__init__(label, api_dir, log_dir, refresh_rate or self.measurement_time + standby / 1000, scheduler)
+        self.i2c_addr = i2c_addr
+        self.i2c_bus = i2c_bus
+        self.sensor = None
+        self._last_data = None
 
-        data['status'] = self.status 
-        data['sensor_data'] = self.get_sensor_readings()
-        push_to_api(self.api_file, data)
+    def _open_sensor(self):
+        return DFRobot_BME280.DFRobot_BME280_I2C(i2c_addr=self.i2c_addr, bus=self.i2c_bus)
 
-        print(f'Stopping {self.label} thread processes in progress')
-        print('Thread process ended')
+    def begin(self):
+        sensor = self._open_sensor()
+        if not sensor.begin():
+            raise RuntimeError(f'{self.label} not found')
+        sensor.set_config_T_standby(self.STANDBY_TIMES[self.standby])
+        self.sensor = sensor
+        print(f"{self.label} setup completed, converting every {self.measurement_time + self.standby / 1000:.3f}s")
 
-    def stop(self):
-        self.status = False
-        print(f'attempting to stop thread of {self.label}')
+    def read(self):
+        deadline = time.monotonic() + 2 * (self.measurement_time + self.standby / 1000) # two conversion periods, whatever the refresh_rate
+        converted = False
 
+        while True:
+            while not self.sensor.get_data_ready_status: # conversion in progress, finished within measurement_time
+                converted = True
+                if time.monotonic() > deadline:
+                    raise TimeoutError('conversion did not finish')
+                time.sleep(self.measurement_time)
+            data = self.sensor.read_data()
+            if converted or data != self._last_data: break
+
+            if time.monotonic() > deadline:
+                raise TimeoutError('no new conversion')
+            time.sleep(self.measurement_time / 2) # no conversion since the last reading, wait for the next one
+        self._last_data = data
+
+        temperature, pressure, humidity = self.sensor.compensate(data)
+        return { 'Temperature,C': round(temperature, 2),
+                 'Pressure,hPa': round(pressure / 100, 2),
+                 'Humidity,%RH': round(humidity, 2),
+                 'Altitude,m': round(self.sensor.calc_altitude(pressure), 2),
+                 'timestamp': datetime.datetime.now().strftime(timestamp_strformat)
+                 }
+
+
+class BME280_SPI(BME280):
+    """BME280 monitor of a sensor on SPI, see DFRobot_BME280_SPI for cs, spi_bus, spi_dev and speed"""
+
+    def __init__(self, label='BME280', api_dir='./api/', log_dir='./log/', refresh_rate=None, scheduler=None, standby=125, cs=8, spi_bus=0, spi_dev=0, speed=500000):
+        super().__init__(label, api_dir, log_dir, refresh_rate, scheduler, standby)
+        self.cs = cs
+        self.spi_bus = spi_bus
+        self.spi_dev = spi_dev
+        self.speed = speed
+
+    def _open_sensor(self):
+        return DFRobot_BME280.DFRobot_BME280_SPI(cs=self.cs, bus=self.spi_bus, dev=self.spi_dev, speed=self.speed)
+
+
+def robust_estimate(samples, method='median', trim=0.2, outlier_k=3.0):
+    """
+    Estimate the true value of noisy samples (a NumPy array). Samples further than outlier_k scaled median absolute
+    deviations from the median (multipath echoes, missed edges) are rejected, and the rest are combined with
+    method: 'median', 'trimmed' (mean without the trim fraction at each end) or 'mean'.
+    Returns the estimate, the 95% confidence half-width of the kept samples, and the number of kept samples.
+    """
+    median = np.median(samples)
+    mad = 1.4826 * np.median(np.abs(samples - median))
+    kept = samples[np.abs(samples - median) <= outlier_k * mad] if mad > 0 else samples[samples == median]
+    kept = np.sort(kept)
+    n = len(kept)
+
+    if method == 'median':
+        estimate = np.median(kept)
+    elif method == 'trimmed':
+        cut = int(n * trim)
+        estimate = kept[cut:n - cut].mean()
+    elif method == 'mean':
+        estimate = kept.mean()
+    else:
+        raise ValueError(f'unknown filter method {method}')
 
-class ultrasonic():
-    def __init__(self, trig_out_pin, echo_in_pin, num_itr=10 , timeout=1, label='HC-SR04P' , api_dir='./api/', log_dir='./log/',refresh_rate=1):
-        self.label = label
-        self.status = False
+    half_width = 1.96 * kept.std(ddof=1) / np.sqrt(n) if n > 1 else np.inf
+    if method == 'median': half_width *= 1.2533  # standard error of the median of normal samples
+
+    return float(estimate), float(half_width), n
+
+
+class EchoTimer():
+    """
+    Measures the width of an echo pulse from edge callbacks instead of polling the echo pin. edge() is called
+    with the pin level and a timestamp on every edge, or with level None where the level is not reported: the
+    first edge after arm() is then taken as rising and the next one as falling. wait() blocks without spinning until
+    the falling edge.
+    diff computes the difference of two timestamps, converted to nanoseconds with scale_ns
+    (e.g. pigpio.tickDiff on microsecond ticks that wrap around).
+    """
+
+    def __init__(self, diff=lambda start, stop: stop - start, scale_ns=1):
+        self.diff = diff
+        self.scale_ns = scale_ns
+        self._done = threading.Event()
+        self._rise = None
+        self.width_ns = None
+
+    def arm(self):
+        self._rise = None
+        self.width_ns = None
+        self._done.clear()
+
+    def edge(self, level, timestamp):
+        if level is None: level = 1 if self._rise is None else 0
+        if level == 1:
+            self._rise = timestamp
+        elif level == 0 and self._rise is not None and not self._done.is_set():
+            self.width_ns = self.diff(self._rise, timestamp) * self.scale_ns
+            self._done.set()
+
+    def wait(self, timeout):
+        if not self._done.wait(timeout):
+            raise TimeoutError("timeout while waiting for echo pulse")
+        return self.width_ns
+
+
+class ultrasonic(SensorMonitor):
+    """
+    HC-SR04 style ultrasonic ranging. The echo pulse is timed from edge callbacks: pigpio callbacks with microsecond
+    ticks stamped by the pigpio daemon when it is running ('pigpio'), RPi.GPIO edge detection stamped with
+    time.perf_counter_ns ('gpio'), or polling the pin with time.perf_counter_ns where edge detection is unavailable ('poll').
+    backend='auto' picks the first one available.
+
+    Each reading filters its pings with robust_estimate (filter, trim, outlier_k). With adaptive=True it stops
+    pinging once the 95% confidence half-width is within ci_cm, after at least min_itr pings and at most max_itr
+    (default 3 * num_itr); otherwise it takes num_itr pings.
+    """
+    def __init__(self, trig_out_pin, echo_in_pin, num_itr=10 , timeout=1, label='HC-SR04P' , api_dir='./api/', log_dir='./log/',refresh_rate=1, scheduler=None, backend='auto',
+                 filter='median', trim=0.2, outlier_k=3.0, adaptive=False, ci_cm=0.5, min_itr=3, max_itr=None):
+        super().__init__(label, api_dir, log_dir, refresh_rate, scheduler)
         self.trig_out_pin = trig_out_pin
         self.echo_in_pin = echo_in_pin
         self.timeout = timeout
         self.num_itr = num_itr
-        self.sensor_readings = None
-        self.api_file = initiate_file(api_dir,label+".json")
-        self.log_file = initiate_file(log_dir,label+"-process.log")
-        self.refresh_rate = refresh_rate
-        self.logger = None
-        self.thread = None
-
-    def set_thread(func):
-        """Decorator Function in order to set the thread property of the object to the output of a function returning  a thread object"""
-        def wrapper(self):
-            self.thread = func(self)
-            print(f'thread object for {self.label} set as {self.thread}')
-            return self.thread
-        return wrapper
+        self.backend = backend
+        self.filter = filter
+        self.trim = trim
+        self.outlier_k = outlier_k
+        self.adaptive = adaptive
+        self.ci_cm = ci_cm
+        self.min_itr = min_itr
+        self.max_itr = max_itr or 3 * num_itr
+        self.echo = None
+        self._pi = None
+        self._callback = None
 
     def begin(self):
         """
         initialize and setup the sensor
         """ 
-        
-        if GPIO.getmode() != GPIO.BCM:
-            GPIO.setmode(GPIO.BCM)
-        
-        GPIO.setup(self.trig_out_pin, GPIO.OUT)
-        GPIO.setup(self.echo_in_pin, GPIO.IN)
-        GPIO.output(self.trig_out_pin, GPIO.LOW)
+        backend = None
+        if self.backend in ('auto', 'pigpio'):
+            pi = pigpio.pi()
+            if pi.connected:
+                pi.set_mode(self.trig_out_pin, pigpio.OUTPUT)
+                pi.set_mode(self.echo_in_pin, pigpio.INPUT)
+                pi.write(self.trig_out_pin, 0)
+                self.echo = EchoTimer(diff=pigpio.tickDiff, scale_ns=1000)
+                self._callback = pi.callback(self.echo_in_pin, pigpio.EITHER_EDGE, lambda gpio, level, tick: self.echo.edge(level, tick))
+                self._pi = pi
+                backend = 'pigpio'
+            elif self.backend == 'pigpio':
+                raise RuntimeError('pigpio daemon is not running')
+
+        if backend is None:
+            if GPIO.getmode() != GPIO.BCM:
+                GPIO.setmode(GPIO.BCM)
+
+            GPIO.setup(self.trig_out_pin, GPIO.OUT)
+            GPIO.setup(self.echo_in_pin, GPIO.IN)
+            GPIO.output(self.trig_out_pin, GPIO.LOW)
+
+            backend = 'poll'
+            if self.backend in ('auto', 'gpio'):
+                self.echo = EchoTimer()
+                try:
+                    GPIO.add_event_detect(self.echo_in_pin, GPIO.BOTH, callback=self._gpio_edge)
+                    backend = 'gpio'
+                except RuntimeError as e:
+                    if self.backend == 'gpio': raise
+                    print(f'{self.label}: edge detection unavailable ({e}), polling the echo pin')
+
+        self.backend = backend
         time.sleep(5)
 
-        print(f"{self.label} setup completed, sensor initialized")
-
-    def get_distance(self):
-        
-        GPIO.output(self.trig_out_pin, GPIO.HIGH)
-        time.sleep(0.00001)
-        GPIO.output(self.trig_out_pin, GPIO.LOW)
+        print(f"{self.label} setup completed, sensor initialized ({self.backend})")
+
+    def _gpio_edge(self, channel):
+        # the pin may have changed again by the time the RPi.GPIO event thread runs the callback, so the edge
+        # direction is inferred from the order of the edges instead of reading the pin
+        self.echo.edge(None, time.perf_counter_ns())
+
+    def end(self):
+        if self._pi:
+            self._callback.cancel()
+            self._pi.stop()
+            self._pi = None
+            return
+        if self.backend == 'gpio':
+            GPIO.remove_event_detect(self.echo_in_pin)
+        GPIO.cleanup(self.trig_out_pin)
+        GPIO.cleanup(self.echo_in_pin)
 
-        time_start = time.time()
+    def _poll_pulse(self, timeout):
+        time_start = time.perf_counter_ns()
+        timeout_ns = timeout * 1e9
 
         while GPIO.input(self.echo_in_pin) == GPIO.LOW:
-            if time.time()-time_start > self.timeout:
+            if time.perf_counter_ns()-time_start > timeout_ns:
                 raise TimeoutError("timeout while waiting for signal to go high")
 
-        time_start = time.time()
+        time_start = time.perf_counter_ns()
 
         while GPIO.input(self.echo_in_pin) == GPIO.HIGH:
-            if time.time()-time_start > self.timeout:
+            if time.perf_counter_ns()-time_start > timeout_ns:
                 raise TimeoutError("timeout while waiting for signal to go low")
 
-        time_stop = time.time()
+        return time.perf_counter_ns() - time_start
+
+    def get_distance(self, timeout=None):
+        """ping once and return the distance in cm and the echo pulse duration in seconds"""
+        timeout = timeout or self.timeout
+
+        if self._pi:
+            self.echo.arm()
+            self._pi.gpio_trigger(self.trig_out_pin, 10, 1)
+            pulse_ns = self.echo.wait(timeout)
+        else:
+            if self.backend == 'gpio': self.echo.arm()
+            GPIO.output(self.trig_out_pin, GPIO.HIGH)
+            time.sleep(0.00001)
+            GPIO.output(self.trig_out_pin, GPIO.LOW)
+            pulse_ns = self.echo.wait(timeout) if self.backend == 'gpio' else self._poll_pulse(timeout)
 
-        pulse_duration = time_stop - time_start
+        pulse_duration = pulse_ns / 1e9
         
         distance = pulse_duration * 34300/2
 
@@ -334,137 +640,238 @@ class ultrasonic():
 
         return distance, pulse_duration
 
-        
-    def get_sensor_readings(self):
+    def sampled_enough(self, pulses):
+        """whether the echo pulses taken so far are enough for a reading"""
+        n = len(pulses)
+        if not self.adaptive: return n >= self.num_itr
+        if n >= self.max_itr: return True
+        if n < self.min_itr: return False
+        _, half_width, _ = robust_estimate(pulses * 34300/2, self.filter, self.trim, self.outlier_k)
+        return half_width <= self.ci_cm
+
+    def summarize(self, pulses):
+        """filter the echo pulses of a reading into its readings"""
+        pulse, half_width, kept = robust_estimate(pulses, self.filter, self.trim, self.outlier_k)
 
-        cum_dist = 0
-        cum_pulse = 0
+        return {  'distance,cm':round(pulse * 34300/2,2),
+                  'pulse duration,s':round(pulse,5),
+                  'confidence interval,cm':round(half_width * 34300/2,2),
+                  'samples taken':len(pulses),
+                  'outliers rejected':len(pulses) - kept
+                  }
+
+    def read(self):
+
+        pulses = np.empty(self.max_itr if self.adaptive else self.num_itr)
 
         attempts = 0
         successful_reads = 0
 
-        while successful_reads < self.num_itr:
+        while not self.sampled_enough(pulses[:successful_reads]):
 
             try:
-                dist, pulse_duration = self.get_distance()
-                cum_dist += dist
-                cum_pulse +=pulse_duration
-
+                _, pulses[successful_reads] = self.get_distance()
                 successful_reads += 1
 
-            except Exception as e:
+            except TimeoutError:
                 attempts +=1
 
                 if attempts>self.num_itr:
-                    self.sensor_readings = {  'distance,cm':None,
-                                'pulse duration,s':None,
-                                'samples taken':None,
-                                'timestamp': datetime.datetime.now().strftime(timestamp_strformat)
-                                }
-                    
-                    return self.sensor_readings
-            
-            
+                    raise TimeoutError(f'{attempts} pings without echo')
 
-        avg_dist = cum_dist / successful_reads 
-        avg_pulse = cum_pulse / successful_reads 
+        return self.summarize(pulses[:successful_reads])
 
-        self.sensor_readings = {  'distance,cm':round(avg_dist,2),
-                            'pulse duration,s':round(avg_pulse,5),
-                            'samples taken':successful_reads,
-                            'timestamp': datetime.datetime.now().strftime(timestamp_strformat)
-                            }
 
-        return self.sensor_readings
-    
-    @set_thread
-    @threaded
-    def start(self):
-        self.status = True
-        print(f'Starting {self.label} process')
-        data = {'label':self.label}
-        self.begin()
-
-        while self.status:
-            data['status'] = self.status 
-            data['sensor_data'] = self.get_sensor_readings()
-            push_to_api(self.api_file, data)
-            time.sleep(self.refresh_rate)
+class ultrasonic_array(SensorMonitor):
+    """
+    Sweeps several ultrasonic sensors without crosstalk and publishes all their readings in one snapshot.
+    Sensors interfere when they share one of the groups, or are closer than crosstalk_cm according to positions
+    (name: (x, y, z) in cm). The sensors are split into slots of mutually non-interfering sensors, which ping
+    concurrently; the slots ping round-robin, each at least the echo decay time of max_range_cm (plus settle) after
+    the previous one. Sensors are taken with their own filter settings until each has enough pings.
+    ----------
+    sensors : dict()
+        ultrasonic monitors by name, or a list of them named by their label
+    slots : list
+        lists of the names of the sensors pinging concurrently
+    gap : float
+        minimum time between the pings of consecutive slots in seconds
+    """
 
-        data['status'] = self.status 
-        data['sensor_data'] = self.get_sensor_readings()
-        push_to_api(self.api_file, data)
+    def __init__(self, sensors, groups=(), positions=None, crosstalk_cm=50, max_range_cm=400, settle=0.01, label='ultrasonic_array',
+                 api_dir='./api/', log_dir='./log/', refresh_rate=1, scheduler=None):
+        super().__init__(label, api_dir, log_dir, refresh_rate, scheduler)
+        self.sensors = sensors if isinstance(sensors, dict) else {sensor.label: sensor for sensor in sensors}
+        self.gap = 2 * max_range_cm / 34300 + settle
+        self.slots = self._slots(groups, positions or {}, crosstalk_cm)
+        self._executor = None
+
+    def _slots(self, groups, positions, crosstalk_cm):
+        for argument, names in (('groups', [name for group in groups for name in group]), ('positions', positions)):
+            for name in names:
+                if name not in self.sensors:
+                    raise ValueError(f'unknown sensor {name!r} in {argument}, sensors are {sorted(self.sensors)}')
+
+        conflicts = {name: set() for name in self.sensors}
+        for group in groups:
+            for name in group:
+                conflicts[name].update(other for other in group if other != name)
+        for name, position in positions.items():
+            for other, other_position in positions.items():
+                if other != name and sum((a - b) ** 2 for a, b in zip(position, other_position)) < crosstalk_cm ** 2:
+                    conflicts[name].add(other)
+
+        slots = []
+        for name in sorted(self.sensors, key=lambda name: -len(conflicts[name])):
+            for slot in slots:
+                if not conflicts[name] & set(slot):
+                    slot.append(name)
+                    break
+            else:
+                slots.append([name])
+        return slots
 
-        print(f'Stopping {self.label} thread processes in progress')
-        GPIO.cleanup(self.trig_out_pin)
-        GPIO.cleanup(self.echo_in_pin)
-        print('Thread process ended')
-
-    def stop(self):
-        self.status = False
-        print(f'attempting to stop thread of {self.label}')
+    def begin(self):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(len(slot) for slot in self.slots), thread_name_prefix=self.label)
+        for future in [self._executor.submit(sensor.begin) for sensor in self.sensors.values()]:
+            future.result()
+        print(f"{self.label} setup completed, {len(self.sensors)} sensors in {len(self.slots)} slots {self.slots}")
+
+    def end(self):
+        for sensor in self.sensors.values():
+            sensor.end()
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _ping(self, name):
+        try:
+            return self.sensors[name].get_distance(timeout=self.gap)[1]
+        except TimeoutError:
+            return None
 
-class AM2320:
+    def read(self):
+        pulses = {name: np.empty(sensor.max_itr if sensor.adaptive else sensor.num_itr) for name, sensor in self.sensors.items()}
+        counts = dict.fromkeys(self.sensors, 0)
+        misses = dict.fromkeys(self.sensors, 0)
+        active = set(self.sensors)
+        sweep_start = time.perf_counter()
+        next_ping = sweep_start
+
+        while active:
+            for slot in self.slots:
+                slot = [name for name in slot if name in active]
+                if not slot: continue
+
+                time.sleep(max(0, next_ping - time.perf_counter()))
+                next_ping = time.perf_counter() + self.gap
+                for name, pulse in zip(slot, self._executor.map(self._ping, slot)):
+                    sensor = self.sensors[name]
+                    if pulse is None:
+                        misses[name] += 1
+                        if misses[name] > sensor.num_itr: active.discard(name)
+                    else:
+                        pulses[name][counts[name]] = pulse
+                        counts[name] += 1
+                    if sensor.sampled_enough(pulses[name][:counts[name]]): active.discard(name)
+
+        readings = {}
+        for name, sensor in self.sensors.items():
+            readings[name] = sensor.summarize(pulses[name][:counts[name]]) if counts[name] else None
+            if not counts[name]:
+                print(f'error getting {name} readings: {misses[name]} pings without echo')
+        readings['sweep time,s'] = round(time.perf_counter() - sweep_start, 3)
+        return readings
+
+
+def _crc16_table(poly=0xA001):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for bit in range(8):
+            crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+_CRC16_TABLE = _crc16_table()
+
+def crc16(data, crc=0xFFFF):
+    """Modbus CRC-16 of data (AM2320, K30), one table lookup per byte"""
+    for x in data:
+        crc = (crc >> 8) ^ _CRC16_TABLE[(crc ^ x) & 0xFF]
+    return crc
+
+
+class AM2320(SensorMonitor):
+    """
+    AM2320 temperature and humidity sensor on i2c. The i2c device is kept open while the monitor runs and reopened
+    after a bus error. Each reading wakes the sensor and reads it once, retrying up to crc_retries times when the
+    CRC fails. The sensor returns the measurement taken at the previous read, i.e. one refresh_rate old.
+    """
     
-    def __init__(self, i2cbus=1,I2C_ADDR = 0x5c, I2C_SLAVE = 0x0703, label='AM2320', api_dir='./api/', log_dir='./log/', refresh_rate=10):
-        self.label = label
-        self.status = False
+    def __init__(self, i2cbus=1,I2C_ADDR = 0x5c, I2C_SLAVE = 0x0703, label='AM2320', api_dir='./api/', log_dir='./log/', refresh_rate=10, scheduler=None, crc_retries=1):
+        super().__init__(label, api_dir, log_dir, refresh_rate, scheduler)
         self._i2cbus = i2cbus
         self.I2C_ADDR = I2C_ADDR 
         self.I2C_SLAVE = I2C_SLAVE 
-        self.sensor_readings = None
-        self.api_file = initiate_file(api_dir, label+".json")
-        self.log_file = initiate_file(log_dir, label+"-process.log")
-        self.refresh_rate = refresh_rate
-        self.logger = None
-        self.thread = None
-    
-    def set_thread(func):
-        """Decorator Function in order to set the thread property of the object to the output of a function returning  a thread object"""
-        def wrapper(self):
-            self.thread = func(self)
-            print(f'thread object for {self.label} set as {self.thread}')
-            return self.thread
-        return wrapper
+        self.crc_retries = crc_retries
+        self._fd = None
 
     @staticmethod
     def _calc_crc16(data):
-        crc = 0xFFFF
-        for x in data:
-            crc = crc ^ x
-            for bit in range(0, 8):
-                if (crc & 0x0001) == 0x0001:
-                    crc >>= 1
-                    crc ^= 0xA001
-                else:
-                    crc >>= 1
-        return crc
+        return crc16(data)
 
     @staticmethod
     def _combine_bytes(msb, lsb):
         return msb << 8 | lsb
 
-    def readSensor(self):
-        fd = posix.open("/dev/i2c-{}".format(self._i2cbus), posix.O_RDWR)
-        ioctl(fd, self.I2C_SLAVE, self.I2C_ADDR)
-        
+    def begin(self):
+        self._open()
+
+    def end(self):
+        self._close()
+
+    def _open(self):
+        self._fd = posix.open("/dev/i2c-{}".format(self._i2cbus), posix.O_RDWR)
         try:
-            posix.write(fd, b'\0x00')
-        except:
-            pass
+            ioctl(self._fd, self.I2C_SLAVE, self.I2C_ADDR)
+        except OSError:
+            self._close()
+            raise
+
+    def _close(self):
+        if self._fd is not None:
+            posix.close(self._fd)
+            self._fd = None
+
+    def _transfer(self):
+        try:
+            posix.write(self._fd, b'\x00')
+        except OSError:
+            pass  # the sleeping sensor does not acknowledge the wake up
         time.sleep(0.001)
 
-        posix.write(fd, b'\x03\x00\x04')
+        posix.write(self._fd, b'\x03\x00\x04')
         time.sleep(0.0016)
 
-        data = bytearray(posix.read(fd, 8))
-        
-        if data[0] != 0x03 or data[1] != 0x04:
-            posix.close(fd)
-            raise Exception("First two read bytes are a mismatch")
-            
-        if self._calc_crc16(data[0:6]) != self._combine_bytes(data[7], data[6]):
-            posix.close(fd)
+        return bytearray(posix.read(self._fd, 8))
+
+    def readSensor(self):
+        for attempt in range(self.crc_retries + 1):
+            if self._fd is None: self._open()
+            try:
+                data = self._transfer()
+            except OSError:
+                self._close()
+                self._open()
+                data = self._transfer()
+
+            if data[0] != 0x03 or data[1] != 0x04:
+                raise Exception("First two read bytes are a mismatch")
+
+            if crc16(data[0:6]) == self._combine_bytes(data[7], data[6]):
+                break
+        else:
             raise Exception("CRC failed")
             
         temp = self._combine_bytes(data[4], data[5])
@@ -473,88 +880,213 @@ class AM2320:
         temp /= 10.0
         
         humi = self._combine_bytes(data[2], data[3]) / 10.0
-        posix.close(fd)
 
         return temp, humi
 
-    def get_sensor_readings(self):
+    def read(self):
+        temp, humi = self.readSensor()
+
+        return {
+            'temperature,C': temp,
+            'humidity,%': humi,
+            'timestamp': datetime.datetime.now().strftime(timestamp_strformat)
+        }
+
+
+class CommandCapture():
+    """
+    Capture backend running a command per image, fswebcam by default. {device}, {resolution} and {path} in command
+    are filled in per capture; the capture fails if the command does not exit with 0 within timeout seconds.
+    The command runs in its own session so that on timeout its whole process group is terminated, including the
+    capture program started by sudo, which would otherwise keep holding the camera.
+    """
+
+    def __init__(self, command='sudo fswebcam -d {device} -r {resolution} -S 2 -F 10 --no-banner {path}', timeout=30):
+        self.command = shlex.split(command)
+        self.timeout = timeout
+        self.resolution = None
+
+    def open(self, device, resolution):
+        self.resolution = resolution
+
+    def capture(self, device, path):
+        args = [arg.format(device=device, resolution=self.resolution, path=path) for arg in self.command]
+        process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True)
         try:
-            # Read twice as mentioned in the original code
-            temp, humi = self.readSensor()
-            temp, humi = self.readSensor()
-
-            self.sensor_readings = {
-                'temperature,C': temp,
-                'humidity,%': humi,
-                'timestamp': datetime.datetime.now().strftime(timestamp_strformat)
-            }
-            
-            return self.sensor_readings
-        
-        except Exception as e:
-            self.sensor_readings = {
-                'temperature,C': None,
-                'humidity,%': None,
-                'timestamp': datetime.datetime.now().strftime(timestamp_strformat)
-            }
-            
-            return self.sensor_readings
+            _, stderr = process.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self._kill(process)
+            raise
+        if process.returncode != 0:
+            stderr = stderr.decode(errors='replace').strip()[-200:]
+            raise RuntimeError(f'{args[0]} exited with {process.returncode} capturing {device}' + (f': {stderr}' if stderr else ''))
 
+    @staticmethod
+    def _kill(process, grace=1):
+        """terminate the process group of process, sudo relays SIGTERM to its command, then kill what is left"""
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+            try:
+                process.communicate(timeout=grace)
+                return
+            except subprocess.TimeoutExpired:
+                pass
 
-    @set_thread
-    @threaded
-    def start(self):
-        self.status = True
-        print(f'Starting {self.label} process')
-        data = {'label': self.label}
+    def close(self):
+        pass
 
-        while self.status:
-            data['status'] = self.status 
-            data['sensor_data'] = self.get_sensor_readings()
-            push_to_api(self.api_file, data)
-            time.sleep(self.refresh_rate)
 
-        data['status'] = self.status 
-        data['sensor_data'] = self.get_sensor_readings()
-        push_to_api(self.api_file, data)
-        print(f'Stopping {self.label} thread processes in progress')
-        print('Thread process ended')
+class V4L2Capture():
+    """
+    Capture backend keeping each camera streaming through OpenCV's V4L2 backend (mmap buffers), so captures do not
+    spawn a process or wait for the camera to start. Frames older than the capture are flushed by grabbing
+    flush frames first. Requires the opencv-python package.
+    """
 
-    def stop(self):
-        self.status = False
-        print(f'attempting to stop thread of {self.label}')
+    def __init__(self, fourcc='MJPG', flush=1):
+        if not cv2: raise ImportError('V4L2Capture requires the opencv-python package')
+        self.fourcc = fourcc
+        self.flush = flush
+        self.streams = {}
+
+    def open(self, device, resolution):
+        stream = cv2.VideoCapture(device, cv2.CAP_V4L2)
+        if not stream.isOpened():
+            raise RuntimeError(f'could not open {device}')
+        width, height = (int(size) for size in resolution.split('x'))
+        stream.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        stream.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        stream.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        stream.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.streams[device] = stream
+
+    def capture(self, device, path):
+        stream = self.streams[device]
+        for _ in range(self.flush):
+            stream.grab()
+        ok, frame = stream.read()
+        if not ok:
+            raise RuntimeError(f'no frame received from {device}')
+        if not cv2.imwrite(path, frame):
+            raise RuntimeError(f'could not write {path}')
+
+    def close(self):
+        for stream in self.streams.values():
+            stream.release()
+        self.streams = {}
+
+
+class ChangeDetector():
+    """
+    Decides which frames are worth keeping. Each frame is decoded at 1/8 scale in grayscale (libjpeg DCT scaling,
+    so the full image is never decoded), shrunk to size, and compared with the last kept frame of its camera by
+    mean absolute difference (0 to 1). Frames changing by at least threshold are kept, and a frame is always
+    kept keep_every minutes after the last one. Requires the opencv-python package.
+    """
+
+    def __init__(self, threshold=0.02, keep_every=30, size=(32, 24)):
+        if not cv2: raise ImportError('ChangeDetector requires the opencv-python package')
+        self.threshold = threshold
+        self.keep_every = keep_every
+        self.size = size
+        self.kept = {}
+
+    def thumbnail(self, path):
+        image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if image is None:
+            raise RuntimeError(f'could not decode {path}')
+        return cv2.resize(image, self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def __call__(self, key, path, now=None):
+        """return whether to keep the frame at path of camera key, and its change from the last kept frame"""
+        now = time.time() if now is None else now
+        thumbnail = self.thumbnail(path)
+        last = self.kept.get(key)
+
+        if last is None:
+            change = 1.0
+        else:
+            change = float(np.abs(thumbnail - last[1]).mean()) / 255
 
+        keep = change >= self.threshold or last is None or (self.keep_every is not None and now - last[0] >= self.keep_every * 60)
+        if keep: self.kept[key] = (now, thumbnail)
+        return keep, round(change, 4)
 
-class DualUSBCamera:
-    def __init__(self, photo_dir='./photos/', camera1='/dev/video0', camera2='/dev/video2', resolution='640x480',log_latest = False, expiration =60,label='DualCamera', api_dir='./api/', log_dir='./log/', refresh_rate=10):
-        self.label = label
+
+class DualUSBCamera(SensorMonitor):
+    """
+    Takes an image with each of two USB cameras every refresh_rate seconds. Both captures run concurrently through
+    a capture backend: CommandCapture (fswebcam, or any command) by default, or V4L2Capture to keep the cameras
+    streaming. The readings hold the image file names and the capture latency of each camera.
+
+    With log_latest, every image is kept under a timestamped name. The photos of photo_dir are indexed oldest-first
+    once at startup, and the oldest are deleted when older than expiration seconds or when all photos exceed
+    max_photo_size bytes, so the directory is never rescanned. A ChangeDetector as change_detector deletes the
+    new photos that barely differ from the last kept ones; their image readings are None. When one capture fails, the
+    photo of the other camera is still indexed before the error is raised.
+    """
+    def __init__(self, photo_dir='./photos/', camera1='/dev/video0', camera2='/dev/video2', resolution='640x480',log_latest = False, expiration =60,label='DualCamera', api_dir='./api/', log_dir='./log/', refresh_rate=10, scheduler=None, backend=None,
+                 max_photo_size=None, change_detector=None):
+        super().__init__(label, api_dir, log_dir, refresh_rate, scheduler)
         self.log_latest = log_latest
         self.expiration = expiration
-        self.status = False
-        self.sensor_readings=None
+        self.change_detector = change_detector
+        self.retention = retention_policy(max_size=float('inf') if max_photo_size is None else max_photo_size, max_age=expiration)
         self.photo_dir = photo_dir
         self.camera1= camera1
         self.camera2= camera2
         self.resolution = resolution
-        self.api_file = initiate_file(api_dir, label+".json")
-        self.log_file = initiate_file(log_dir, label+"-process.log")
-        self.refresh_rate = refresh_rate
-        self.logger = None
-        self.thread = None
+        self.backend = backend or CommandCapture()
+        self._executor = None
         
         # Ensure the photo directory exists
         if not os.path.exists(self.photo_dir):
             os.makedirs(self.photo_dir)
 
-    def set_thread(func):
-        """Decorator Function to set the thread property of the object to the output of a function returning a thread object"""
-        def wrapper(self):
-            self.thread = func(self)
-            print(f'thread object for {self.label} set as {self.thread}')
-            return self.thread
-        return wrapper
+    def index_photos(self):
+        """index the photos of photo_dir by modification time, the only full scan of the directory"""
+        self.retention.clear()
+        with os.scandir(self.photo_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    self.retention.add(entry.path, ts=stat.st_mtime, size=stat.st_size)
+
+    def purge_photos(self, protected=()):
+        """delete the photos beyond the age and size budgets, oldest first"""
+        for path in self.retention.evict(now=time.time(), protected=protected):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f'Failed to delete {path}. Reason: {e}')
+
+    def begin(self):
+        if self.log_latest: self.index_photos()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix=self.label)
+        for camera in (self.camera1, self.camera2):
+            self.backend.open(camera, self.resolution)
+        print(f"{self.label} setup completed, capturing with {type(self.backend).__name__}")
+
+    def end(self):
+        self.backend.close()
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
 
     def capture_images(self):
+        return self.get_sensor_readings()
+
+    def _capture(self, camera, path):
+        start = time.perf_counter()
+        self.backend.capture(camera, path)
+        return start, time.perf_counter()
+
+    def read(self):
         ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
         formatted_ts = datetime.datetime.strptime(ts, '%Y%m%d_%H%M%S').strftime(timestamp_strformat)
 
@@ -566,136 +1098,282 @@ class DualUSBCamera:
         image_1_path = os.path.join(self.photo_dir, image_1_filename)
         image_2_path = os.path.join(self.photo_dir, image_2_filename)
 
-        # Capture images using fswebcam
-        try:
-            if self.log_latest: delete_contents(self.photo_dir, self.expiration)
-
-            os.system(f'sudo fswebcam -d {self.camera1} -r {self.resolution} -S 2 -F 10 --no-banner {image_1_path}')
-            os.system(f'sudo fswebcam -d {self.camera2} -r {self.resolution} -S 2 -F 10 --no-banner {image_2_path}')
-            print(f'Images saved to {image_1_path} and {image_2_path}')
+        if self._executor is None: self.begin()
+        futures = [self._executor.submit(self._capture, self.camera1, image_1_path),
+                   self._executor.submit(self._capture, self.camera2, image_2_path)]
+        concurrent.futures.wait(futures)
+        errors = [str(future.exception()) for future in futures if future.exception()]
+
+        readings = {'image_1': os.path.basename(image_1_path), 'image_2': os.path.basename(image_2_path)}
+        if self.log_latest:
+            now = time.time()
+            kept = []
+            for camera, path, future in (('1', image_1_path, futures[0]), ('2', image_2_path, futures[1])):
+                if future.exception():
+                    try:
+                        os.unlink(path) # partial image of the failed capture, never indexed
+                    except FileNotFoundError:
+                        pass
+                    continue
+                if self.change_detector:
+                    keep, readings[f'change_{camera}'] = self.change_detector(camera, path, now)
+                    if not keep:
+                        os.unlink(path)
+                        readings[f'image_{camera}'] = None
+                        continue
+                self.retention.add(path, ts=now, size=os.path.getsize(path))
+                kept.append(path)
+            self.purge_photos(protected=kept)
+        if errors:
+            raise RuntimeError('; '.join(errors))
+        (start_1, end_1), (start_2, end_2) = (future.result() for future in futures)
+        print(f'Images saved: {readings["image_1"]} and {readings["image_2"]}')
+
+        readings.update({
+            'latency_1,s': round(end_1 - start_1, 3),
+            'latency_2,s': round(end_2 - start_2, 3),
+            'capture skew,s': round(abs(end_1 - end_2), 3),
+            'timestamp': formatted_ts
+        })
+        return readings
+
+
+class SerialProtocol():
+    """
+    Request/response engine on a serial port that is kept open between requests and reopened after an error.
+    transact() writes a Modbus-style request and reads exactly the expected number of bytes, returning as soon as
+    the frame is complete; timeout bounds the wait for the first byte and inter_byte_timeout the gaps within the
+    frame. Frames ending with a little-endian crc16 of the rest are validated.
+    """
 
-            self.sensor_readings= {
-                'image_1': os.path.basename(image_1_path),
-                'image_2': os.path.basename(image_2_path),
-                'timestamp': formatted_ts
-            }
+    def __init__(self, serial_device, baudrate=9600, timeout=1, inter_byte_timeout=0.05):
+        self.serial_device = serial_device
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.inter_byte_timeout = inter_byte_timeout
+        self.ser = None
 
-            return self.sensor_readings
-        except Exception as e:
-            print(f'Error capturing images: {e}')
+    def open(self):
+        if self.ser is None:
+            self.ser = serial.Serial(self.serial_device, self.baudrate, timeout=self.timeout, inter_byte_timeout=self.inter_byte_timeout)
+        return self.ser
 
-            self.sensor_readings= {
-                'image_1': None,
-                'image_2': None,
-                'timestamp': formatted_ts
-            }
-            return self.sensor_readings
+    def close(self):
+        if self.ser is not None:
+            self.ser.close()
+            self.ser = None
 
-    @set_thread
-    @threaded
-    def start(self):
-        self.status = True
-        print(f'Starting {self.label} process')
-        data = {'label': self.label}
+    @staticmethod
+    def check_crc(frame):
+        if crc16(frame[:-2]) != frame[-2] | frame[-1] << 8:
+            raise ValueError(f'CRC failed on response {frame.hex()}')
+        return frame
 
-        while self.status:
-            data['status'] = self.status 
-            data['sensor_data'] = self.capture_images()
-            push_to_api(self.api_file, data)
-            time.sleep(self.refresh_rate)
-        
-        data['status'] = self.status 
-        data['sensor_data'] = self.capture_images()
-        push_to_api(self.api_file, data)
+    def transact(self, request, response_length, check_crc=True):
+        try:
+            ser = self.open()
+            ser.reset_input_buffer()
+            ser.write(request)
+            response = ser.read(response_length)
+        except serial.SerialException:
+            self.close()
+            raise
 
-        print(f'Stopping {self.label} thread processes in progress')
-        print('Thread process ended')
+        if len(response) != response_length:
+            raise TimeoutError(f'{len(response)} of {response_length} response bytes received from {self.serial_device}')
 
-    def stop(self):
-        self.status = False
-        print(f'attempting to stop thread of {self.label}')
+        return self.check_crc(response) if check_crc else response
 
 
-class K30_CO2():
-    def __init__(self, serial_device = "/dev/ttyS0", baudrate=9600, label='k30_CO2', api_dir='./api/', log_dir='./log/', refresh_rate=1):
+class K30_CO2(SensorMonitor):
+    """
+    Senseair K30 CO2 sensor on a serial port, read with the Modbus-style read RAM command (0x44) through a
+    SerialProtocol kept open while the monitor runs.
+    """
+    READ_CO2 = b'\xFE\x44\x00\x08\x02\x9F\x25'
+    RESPONSE_LENGTH = 7
 
-        self.label = label
-        # self.ser = serial.Serial(serial_device, baudrate=baudrate, timeout = .5)
+    def __init__(self, serial_device = "/dev/ttyS0", baudrate=9600, label='k30_CO2', api_dir='./api/', log_dir='./log/', refresh_rate=1, scheduler=None, timeout=1):
+        super().__init__(label, api_dir, log_dir, refresh_rate, scheduler)
         self.serial_device = serial_device
         self.baudrate = baudrate
-        self.status = False
-        self.api_file = initiate_file(api_dir,label+".json")
-        self.log_file = initiate_file(log_dir,label+"-process.log")
-        self.refresh_rate = refresh_rate
-        self.logger = None
-        self.thread = None
-        self.sensor_readings = None
-
-    def set_thread(func):
-        """Decorator Function in order to set the thread property of the object to the output of a function returning  a thread object"""
-        def wrapper(self):
-            self.thread = func(self)
-            print(f'thread object for {self.label} set as {self.thread}')
-            return self.thread
-        return wrapper
+        self.protocol = SerialProtocol(serial_device, baudrate, timeout=timeout)
 
+    @staticmethod
+    def request(address=0xFE):
+        """read CO2 request for the sensor at address, 0xFE addresses any sensor"""
+        frame = bytes([address]) + K30_CO2.READ_CO2[1:5]
+        crc = crc16(frame)
+        return frame + bytes([crc & 0xFF, crc >> 8])
 
-    def get_sensor_readings(self):
+    @staticmethod
+    def parse(resp):
+        return { "CO2_ppm": (resp[3]*256) + resp[4] }
 
-        try:
-            with serial.Serial(self.serial_device, self.baudrate, timeout=5) as ser:
-
-                ser.flushInput()
-                ser.write(b'\xFE\x44\x00\x08\x02\x9F\x25')
-                time.sleep(.5)
-                resp = ser.read(7)
-                high = resp[3]
-                low = resp[4]
-                co2 =  (high*256) +low
-            
-                self.sensor_readings = { "CO2_ppm":co2,
-                                        "timestamp": datetime.datetime.now().strftime(timestamp_strformat)
-                                    }
+    def read(self):
 
-            return self.sensor_readings
-        except:
-            print(f'error getting {self.label} readings')
-            return None
+        resp = self.protocol.transact(self.READ_CO2, self.RESPONSE_LENGTH)
+        readings = self.parse(resp)
+        readings["timestamp"] = datetime.datetime.now().strftime(timestamp_strformat)
+        return readings
 
     def begin(self):
 
+        self.protocol.open()
         print(f"{self.label} setup completed, initialized")
 
-    @set_thread
-    @threaded
-    def start(self):
-        
-        self.status = True
-        self.begin()            
+    def end(self):
 
-        print(f'Starting {self.label} process')
-        data = {'label': self.label}
+        self.protocol.close()
 
-        while self.status:
-            data['status'] = self.status 
-            data['sensor_data'] = self.get_sensor_readings()
-            
-            push_to_api(self.api_file, data)
-            time.sleep(self.refresh_rate)
-        
-        print(f'Stopping {self.label} thread processes in progress')
-        
-        data['status'] = self.status 
-        data['sensor_data'] = self.get_sensor_readings()
-        push_to_api(self.api_file, data)
-        
-        print('Thread process ended')
 
 
-    def stop(self):
-        self.status = False
-        print(f'attempting to stop thread of {self.label}')
+class SerialBus(SensorMonitor):
+    """
+    Reads many serial sensors from one thread. Ports (UARTs, USB-serial adapters, RS-485 buses with several addressed
+    sensors) are kept open and polled with selectors: every reading sends the first request on each port at once,
+    and each response is dispatched to the parser of its sensor as soon as it is complete, with the next request
+    on that port sent right away. timeout bounds the wait for a response and inter_byte_timeout the gaps within it.
+    The readings of all sensors are published in one snapshot along with the request rate and latency of each port.
+    ----------
+    ports : dict()
+        open serial.Serial of each device
+    sensors : dict()
+        device, request, response_length, parser and check_crc of each sensor by name
+    stats : dict()
+        requests, errors, responses and total and max latency of each device
+    """
+
+    def __init__(self, label='serial_bus', api_dir='./api/', log_dir='./log/', refresh_rate=1, scheduler=None, timeout=1, inter_byte_timeout=0.05):
+        super().__init__(label, api_dir, log_dir, refresh_rate, scheduler)
+        self.timeout = timeout
+        self.inter_byte_timeout = inter_byte_timeout
+        self.baudrates = {}
+        self.ports = {}
+        self.sensors = {}
+        self.stats = {}
+        self._started = time.monotonic()
+
+    def add_sensor(self, name, serial_device, request, response_length, parser, baudrate=9600, check_crc=True):
+        """add a sensor answering request on serial_device with response_length bytes, parsed into readings by parser"""
+        self.baudrates[serial_device] = baudrate
+        self.stats.setdefault(serial_device, {'requests': 0, 'responses': 0, 'errors': 0, 'latency': 0, 'max latency': 0})
+        self.sensors[name] = {'device': serial_device, 'request': request, 'response_length': response_length,
+                              'parser': parser, 'check_crc': check_crc}
+
+    def add_k30(self, name, serial_device, address=0xFE, baudrate=9600):
+        """add a K30 CO2 sensor, address tells the sensors of an RS-485 bus apart"""
+        self.add_sensor(name, serial_device, K30_CO2.request(address), K30_CO2.RESPONSE_LENGTH, K30_CO2.parse, baudrate)
 
+    def begin(self):
+        for device, baudrate in self.baudrates.items():
+            self._open(device)
+        print(f"{self.label} setup completed, {len(self.sensors)} sensors on {len(self.ports)} ports")
+
+    def end(self):
+        for device in list(self.ports):
+            self._close(device)
+
+    def _open(self, device):
+        if device not in self.ports:
+            self.ports[device] = serial.Serial(device, self.baudrates[device], timeout=0)
+        return self.ports[device]
+
+    def _close(self, device):
+        port = self.ports.pop(device, None)
+        if port is not None: port.close()
+
+    def _send(self, device, name):
+        """send the request of sensor name on device, returning its pending transaction"""
+        sensor = self.sensors[name]
+        port = self._open(device)
+        port.reset_input_buffer()
+        port.write(sensor['request'])
+        self.stats[device]['requests'] += 1
+        now = time.monotonic()
+        return {'name': name, 'buffer': bytearray(), 'sent': now, 'deadline': now + self.timeout}
+
+    def _complete(self, device, pending, readings):
+        name = pending['name']
+        sensor = self.sensors[name]
+        stats = self.stats[device]
+        try:
+            response = bytes(pending['buffer'])
+            if len(response) != sensor['response_length']:
+                raise TimeoutError(f'{len(response)} of {sensor["response_length"]} response bytes received from {device}')
+            if sensor['check_crc']: SerialProtocol.check_crc(response)
+            readings[name] = sensor['parser'](response)
+            latency = time.monotonic() - pending['sent']
+            stats['responses'] += 1
+            stats['latency'] += latency
+            stats['max latency'] = max(stats['max latency'], latency)
+        except Exception as e:
+            readings[name] = None
+            stats['errors'] += 1
+            print(f'error getting {name} readings: {type(e).__name__}: {e}')
+
+    def read(self):
+        queues = collections.defaultdict(collections.deque)
+        for name, sensor in self.sensors.items():
+            queues[sensor['device']].append(name)
+
+        readings = {}
+        pending = {}
+        with selectors.DefaultSelector() as selector:
+
+            def send_next(device):
+                while queues[device]:
+                    name = queues[device].popleft()
+                    try:
+                        pending[device] = self._send(device, name)
+                        selector.register(self.ports[device], selectors.EVENT_READ, device)
+                        return
+                    except (OSError, serial.SerialException) as e:
+                        self._close(device)
+                        readings[name] = None
+                        self.stats[device]['errors'] += 1
+                        print(f'error getting {name} readings: {type(e).__name__}: {e}')
+
+            def finish(device, failed=False):
+                selector.unregister(self.ports[device])
+                if failed: self._close(device)
+                self._complete(device, pending.pop(device), readings)
+                send_next(device)
+
+            for device in list(queues):
+                send_next(device)
+
+            while pending:
+                timeout = max(0, min(transaction['deadline'] for transaction in pending.values()) - time.monotonic())
+                for key, events in selector.select(timeout):
+                    device = key.data
+                    transaction = pending[device]
+                    response_length = self.sensors[transaction['name']]['response_length']
+                    try:
+                        transaction['buffer'] += key.fileobj.read(response_length - len(transaction['buffer']))
+                    except (OSError, serial.SerialException):
+                        finish(device, failed=True)
+                        continue
+                    transaction['deadline'] = time.monotonic() + self.inter_byte_timeout
+                    if len(transaction['buffer']) == response_length:
+                        finish(device)
+
+                now = time.monotonic()
+                for device in [device for device, transaction in pending.items() if transaction['deadline'] <= now]:
+                    finish(device)
+
+        readings['ports'] = self.port_stats()
+        return readings
+
+    def port_stats(self):
+        """request rate since start and latency of each port"""
+        elapsed = time.monotonic() - self._started
+        return {device: {'requests': stats['requests'],
+                         'errors': stats['errors'],
+                         'rate,Hz': round(stats['requests'] / elapsed, 2),
+                         'latency,ms': round(stats['latency'] / stats['responses'] * 1000, 1) if stats['responses'] else None,
+                         'max latency,ms': round(stats['max latency'] * 1000, 1)}
+                for device, stats in self.stats.items()}
 
 
 if __name__ == '__main__':
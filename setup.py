@@ -35,6 +35,7 @@ setuptools.setup(
           'pigpio',
           'smbus',
           'spidev',
-          'pyserial'
+          'pyserial',
+          'numpy'
       ]
 )
@@ -0,0 +1,77 @@
+import os, time, tempfile
+from rpi_sensor_monitors import monitors
+
+num_captures = 5
+capture_time = 0.3
+
+def bench(tmp):
+    """Captures with a fake command standing in for fswebcam, taking capture_time per image"""
+    fake = monitors.CommandCapture(f"sh -c 'sleep {capture_time}; echo {{device}} > {{path}}'", timeout=5)
+    camera = monitors.DualUSBCamera(photo_dir=tmp + 'photos/', api_dir=tmp, log_dir=tmp, log_latest=False, backend=fake)
+    camera.begin()
+    start = time.perf_counter()
+    for _ in range(num_captures):
+        readings = camera.read()
+    elapsed = (time.perf_counter() - start) / num_captures
+    print(f'DualUSBCamera: {elapsed:.3f}s per capture cycle ({2 * capture_time:.1f}s one camera after the other), '
+          f'latencies {readings["latency_1,s"]}s and {readings["latency_2,s"]}s, skew {readings["capture skew,s"]}s')
+    assert elapsed < 1.5 * capture_time
+    assert open(tmp + 'photos/camera2.jpg').read().strip() == camera.camera2
+
+    camera.backend = monitors.CommandCapture("sh -c 'exit 3'")
+    try:
+        camera.read()
+        raise AssertionError('failed capture not reported')
+    except RuntimeError as e:
+        print(f'DualUSBCamera: failed capture reported ({e})')
+    camera.end()
+
+def bench_retention(tmp, num_photos=5000, photo_size=1000):
+    """Timelapse captures into a directory of num_photos older photos, kept within a size budget"""
+    photo_dir = tmp + 'timelapse/'
+    os.makedirs(photo_dir)
+    now = time.time()
+    for i in range(num_photos):
+        path = f'{photo_dir}camera1_{i:06d}.jpg'
+        with open(path, 'wb') as f: f.write(b'\0' * photo_size)
+        os.utime(path, (now - num_photos + i, now - num_photos + i))
+
+    fake = monitors.CommandCapture(f"sh -c 'head -c {photo_size} /dev/zero > {{path}}'")
+    camera = monitors.DualUSBCamera(photo_dir=photo_dir, api_dir=tmp, log_dir=tmp, log_latest=True, expiration=None,
+                                    max_photo_size=num_photos * photo_size // 2, backend=fake)
+    start = time.perf_counter()
+    camera.begin()
+    print(f'DualUSBCamera: indexed {len(camera.retention)} photos in {time.perf_counter() - start:.3f}s')
+
+    start = time.perf_counter()
+    camera.read()
+    print(f'DualUSBCamera: capture with retention of {num_photos} photos in {time.perf_counter() - start:.3f}s')
+    camera.end()
+
+    on_disk = sum(entry.stat().st_size for entry in os.scandir(photo_dir))
+    assert on_disk == camera.retention.total_size <= camera.retention.max_size
+    assert not os.path.exists(f'{photo_dir}camera1_000000.jpg')
+
+def bench_change_detection(tmp, num_frames=50):
+    """Timelapse of a static scene with sensor noise, where the lights switch on half way"""
+    import numpy as np, cv2
+    rng = np.random.default_rng(0)
+    scene = cv2.resize(rng.integers(0, 255, (48, 64), dtype=np.uint8), (640, 480))
+    frames = tmp + 'frames/'
+    os.makedirs(frames)
+    for i in range(num_frames):
+        frame = scene.astype(np.int16) + rng.normal(0, 3, scene.shape) + (60 if i >= num_frames // 2 else 0)
+        cv2.imwrite(f'{frames}{i}.jpg', np.clip(frame, 0, 255).astype(np.uint8))
+
+    detector = monitors.ChangeDetector(threshold=0.05, keep_every=30)
+    start = time.perf_counter()
+    kept = [i for i in range(num_frames) if detector('1', f'{frames}{i}.jpg', now=i * 60)[0]]
+    elapsed = (time.perf_counter() - start) / num_frames
+    print(f'ChangeDetector: kept frames {kept} of {num_frames}, {elapsed * 1000:.1f} ms per frame')
+    assert kept == [0, num_frames // 2]
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        bench(tmp + '/')
+        bench_retention(tmp + '/')
+        if monitors.cv2: bench_change_detection(tmp + '/')
@@ -0,0 +1,45 @@
+import os, pty, tty, time, tempfile, threading
+from rpi_sensor_monitors import monitors
+
+num_reads = 50
+
+class SimulatedK30():
+    """K30 answering read CO2 requests on the master side of a pseudo-terminal, at the wire time of 9600 baud"""
+    def __init__(self, co2_ppm=500, corrupt=False):
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.device = os.ttyname(slave)
+        body = b'\xFE\x44\x02' + co2_ppm.to_bytes(2, 'big')
+        crc = monitors.crc16(body) ^ corrupt
+        self.response = body + bytes([crc & 0xFF, crc >> 8])
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            if os.read(self.master, 7) != monitors.K30_CO2.READ_CO2: continue
+            time.sleep(len(self.response) * 10 / 9600)
+            os.write(self.master, self.response[:3])
+            os.write(self.master, self.response[3:])
+
+def bench(tmp):
+    sensor = monitors.K30_CO2(serial_device=SimulatedK30().device, api_dir=tmp, log_dir=tmp)
+    sensor.begin()
+    start = time.perf_counter()
+    for _ in range(num_reads):
+        assert sensor.read()['CO2_ppm'] == 500
+    elapsed = (time.perf_counter() - start) / num_reads
+    sensor.end()
+    print(f'K30_CO2: {elapsed * 1000:.1f} ms per reading')
+    assert elapsed < 0.1
+
+    sensor = monitors.K30_CO2(serial_device=SimulatedK30(corrupt=True).device, api_dir=tmp, log_dir=tmp)
+    try:
+        sensor.read()
+        raise AssertionError('corrupt response accepted')
+    except ValueError as e:
+        print(f'K30_CO2: corrupt response rejected ({e})')
+    sensor.end()
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        bench(tmp + '/')
@@ -0,0 +1,54 @@
+import os, time, random, datetime, tempfile
+from rpi_control_center.data import csv_handler, retention_policy
+
+num_files = 5000
+num_rows = 20000
+
+def disk_usage(handler):
+    """Sum the sizes of the data files of handler found on disk, the .idx sidecars are not counted by the handler"""
+    return sum(os.path.getsize(handler.base_dir + file) for file in os.listdir(handler.base_dir) if handler._is_data_file(file))
+
+def index_usage(handler):
+    """Sum the sizes of the .idx sidecar indexes of handler found on disk"""
+    return sum(os.path.getsize(handler.base_dir + file) for file in os.listdir(handler.base_dir) if file.endswith('.idx'))
+
+def bench_policy(n=100000):
+    policy = retention_policy(max_size=n // 2 * 100)
+    keys = list(range(n))
+    random.shuffle(keys)
+
+    start = time.perf_counter()
+    for key in keys:
+        policy.add(key, ts=key, size=100)
+        policy.evict()
+    elapsed = time.perf_counter() - start
+
+    assert policy.total_size <= policy.max_size
+    assert min(policy._entries) == n - len(policy)  # only the newest files are kept
+    print(f'retention_policy: {n} add+evict in {elapsed:.3f}s ({elapsed / n * 1e6:.2f} us/op)')
+
+def bench_handler(base_dir):
+    for i in range(num_files):
+        ts = (datetime.datetime(2020, 1, 1) + datetime.timedelta(minutes=i)).strftime('%Y%m%d%H%M%S')
+        with open(f'{base_dir}{ts}_bench.csv', 'w') as f:
+            f.write('value,timestamp\n' + '1,2020/01/01 00:00:00\n' * 20)
+
+    start = time.perf_counter()
+    handler = csv_handler(base_dir=base_dir, filename='bench', max_file_size=1, max_handling_size=500, compression=None)
+    print(f'csv_handler startup with {num_files} files: {time.perf_counter() - start:.3f}s, {len(handler.retention)} files kept')
+
+    start = time.perf_counter()
+    for i in range(num_rows):
+        handler({'value': i, 'padding': 'x' * random.randint(0, 200)})
+        if i % 1000 == 0: assert disk_usage(handler) <= handler.max_handling_size
+    elapsed = time.perf_counter() - start
+    handler.close()
+
+    assert disk_usage(handler) == handler.total_size <= handler.max_handling_size
+    print(f'csv_handler: {num_rows} rows in {elapsed:.3f}s ({num_rows / elapsed:.0f} rows/s), {disk_usage(handler)} of {handler.max_handling_size} bytes used'
+          f' plus {index_usage(handler)} bytes of sidecar indexes')
+
+if __name__ == '__main__':
+    bench_policy()
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_handler(tmp + '/')
@@ -0,0 +1,60 @@
+import os, pty, tty, time, tempfile, threading
+from rpi_sensor_monitors import monitors
+
+num_ports = 4
+sensors_per_port = 3
+num_sweeps = 20
+
+class SimulatedRS485():
+    """RS-485 bus of K30 sensors on the master side of a pseudo-terminal, each answering at 9600 baud wire time"""
+    def __init__(self, addresses, silent=()):
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.device = os.ttyname(slave)
+        self.responses = {}
+        for address in addresses:
+            if address in silent: continue
+            body = bytes([address, 0x44, 0x02]) + (400 + address).to_bytes(2, 'big')
+            crc = monitors.crc16(body)
+            self.responses[monitors.K30_CO2.request(address)] = body + bytes([crc & 0xFF, crc >> 8])
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        buffer = b''
+        while True:
+            buffer += os.read(self.master, 64)
+            while len(buffer) >= 7:
+                request, buffer = buffer[:7], buffer[7:]
+                response = self.responses.get(request)
+                if response is None: continue
+                time.sleep((len(request) + len(response)) * 10 / 9600)
+                os.write(self.master, response)
+
+def bench(tmp):
+    bus = monitors.SerialBus(api_dir=tmp, log_dir=tmp, timeout=0.2)
+    buses = []
+    for port in range(num_ports):
+        addresses = [port * sensors_per_port + i + 1 for i in range(sensors_per_port)]
+        rs485 = SimulatedRS485(addresses, silent=[1])
+        buses.append(rs485)
+        for address in addresses:
+            bus.add_k30(f'co2_{address}', rs485.device, address=address)
+    bus.begin()
+
+    start = time.perf_counter()
+    for _ in range(num_sweeps):
+        readings = bus.read()
+    elapsed = (time.perf_counter() - start) / num_sweeps
+    bus.end()
+
+    assert readings['co2_1'] is None
+    assert all(readings[f'co2_{address}']['CO2_ppm'] == 400 + address for address in range(2, num_ports * sensors_per_port + 1))
+    wire_time = sensors_per_port * 14 * 10 / 9600
+    print(f'SerialBus: {len(bus.sensors)} sensors on {num_ports} ports in {elapsed * 1000:.1f} ms per sweep '
+          f'({wire_time * 1000:.1f} ms wire time per port, one missing sensor timing out after {bus.timeout}s)')
+    for device, stats in readings['ports'].items():
+        print(f'    {device}: {stats}')
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        bench(tmp + '/')
@@ -0,0 +1,143 @@
+import time, random, threading, queue
+from rpi_sensor_monitors import monitors
+
+num_pings = 200
+distance_cm = 50
+
+class SimulatedGPIO():
+    """
+    Stand-in for RPi.GPIO that answers every trigger with an echo pulse of the width for distance_cm,
+    driving the edge callbacks from a thread like the RPi.GPIO event thread does. With dispatch_latency the
+    callbacks run that long after their edge from a separate thread, when the pin may already have changed again.
+    The actual width of every echo is kept in widths.
+    """
+    BCM = 11; OUT = 0; IN = 1; LOW = 0; HIGH = 1; BOTH = 33
+
+    def __init__(self, distance_cm, latency=0.0002, edge_detection=True, dispatch_latency=0.0):
+        self.pulse = distance_cm * 2 / 34300
+        self.latency = latency
+        self.dispatch_latency = dispatch_latency
+        self.edge_detection = edge_detection
+        self.level = 0
+        self.callback = None
+        self.mode = None
+        self.widths = []
+        self._events = queue.Queue()
+        if dispatch_latency: threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def getmode(self): return self.mode
+    def setmode(self, mode): self.mode = mode
+    def setup(self, *args, **kwargs): pass
+    def cleanup(self, *args): pass
+    def input(self, channel): return self.level
+    def remove_event_detect(self, channel): self.callback = None
+
+    def add_event_detect(self, channel, edge, callback):
+        if not self.edge_detection: raise RuntimeError('Failed to add edge detection')
+        self.callback = callback
+
+    def output(self, channel, level):
+        if level == self.LOW: threading.Thread(target=self._echo, args=(channel,)).start()
+
+    def _dispatch(self):
+        while True:
+            edge_time = self._events.get()
+            time.sleep(max(0, edge_time + self.dispatch_latency - time.perf_counter()))
+            if self.callback: self.callback(0)
+
+    def _edge(self, level):
+        self.level = level
+        if self.dispatch_latency: self._events.put(time.perf_counter())
+        elif self.callback: self.callback(0)
+
+    def _echo(self, channel):
+        time.sleep(self.latency)
+        rise = time.perf_counter()
+        self._edge(1)
+        time.sleep(self.pulse)
+        self.widths.append(time.perf_counter() - rise)
+        self._edge(0)
+
+def bench(backend, distance_cm=distance_cm, **kwargs):
+    monitors.GPIO = gpio = SimulatedGPIO(distance_cm, **kwargs)
+    sensor = monitors.ultrasonic(23, 24, backend=backend)
+    monitors.time.sleep, sleep = (lambda s: None), monitors.time.sleep
+    try: sensor.begin()
+    finally: monitors.time.sleep = sleep
+
+    errors = []
+    cpu, wall = time.process_time(), time.perf_counter()
+    for _ in range(num_pings):
+        distance, pulse = sensor.get_distance()
+        errors.append(abs(pulse - gpio.widths[-1]) * 34300 / 2)
+        time.sleep(0.001)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    sensor.end()
+
+    errors.sort()
+    print(f'{sensor.backend:>5} at {distance_cm} cm: {num_pings} pings, cpu {cpu / wall:.0%} of wall time, median error {errors[len(errors) // 2]:.2f} cm, max error {errors[-1]:.2f} cm')
+    return cpu, errors[len(errors) // 2]
+
+class MultipathEcho():
+    """Pings of distance_cm with gaussian noise where a fraction of the echoes arrive via a longer path"""
+    def __init__(self, noise_cm=0.3, multipath=0.1):
+        self.noise_cm = noise_cm
+        self.multipath = multipath
+        self.pings = 0
+
+    def __call__(self):
+        self.pings += 1
+        distance = random.gauss(distance_cm, self.noise_cm)
+        if random.random() < self.multipath: distance *= random.uniform(1.5, 3)
+        return distance, distance * 2 / 34300
+
+def bench_filter(num_readings=500, **kwargs):
+    sensor = monitors.ultrasonic(23, 24, **kwargs)
+    sensor.get_distance = echo = MultipathEcho()
+    errors = sorted(abs(sensor.read()['distance,cm'] - distance_cm) for _ in range(num_readings))
+    print(f'{str(kwargs):>45}: {echo.pings / num_readings:5.1f} pings/reading, median error {errors[len(errors) // 2]:.2f} cm, p95 error {errors[int(len(errors) * .95)]:.2f} cm')
+    return echo.pings / num_readings, errors[int(len(errors) * .95)]
+
+def bench_array(num_sensors=6):
+    """Sensors around a tank in three groups facing each other, each echo takes the time of its flight"""
+    sensors = []
+    for i in range(num_sensors):
+        sensor = monitors.ultrasonic(23, 24, label=f'tank_{i}', num_itr=5)
+        sensor.begin = sensor.end = lambda: None
+        def get_distance(timeout=None, echo=MultipathEcho(multipath=0)):
+            distance, pulse = echo()
+            time.sleep(pulse)
+            return distance, pulse
+        sensor.get_distance = get_distance
+        sensors.append(sensor)
+
+    groups = [[f'tank_{i}' for i in range(j, num_sensors, 3)] for j in range(3)]
+    array = monitors.ultrasonic_array(sensors, groups=groups, max_range_cm=100)
+    array.begin()
+    readings = array.read()
+    array.end()
+
+    sequential = sum(sensor.num_itr for sensor in sensors) * array.gap
+    print(f'ultrasonic_array: {num_sensors} sensors in {len(array.slots)} slots, sweep {readings["sweep time,s"]:.3f}s (one at a time {sequential:.3f}s)')
+    assert all(abs(readings[sensor.label]['distance,cm'] - distance_cm) < 1 for sensor in sensors)
+    assert readings['sweep time,s'] < sequential
+
+if __name__ == '__main__':
+    bench_array()
+
+    bench_filter(filter='mean', outlier_k=float('inf'))
+    fixed_pings, _ = bench_filter(filter='median')
+    bench_filter(filter='trimmed')
+    adaptive_pings, _ = bench_filter(filter='median', adaptive=True)
+    assert adaptive_pings < fixed_pings
+
+
+    # polling also starves the simulated echo thread of the GIL, which shows up as its larger error
+    poll, _ = bench('poll')
+    edge, edge_error = bench('gpio')
+    assert edge < poll, 'edge timing should use less cpu than polling'
+    assert edge_error < 1, 'edge timing should measure the echo pulse within 1 cm'
+
+    # a 5 cm echo ends before its rising edge callback runs, the edge order still gives the pulse width
+    _, near_error = bench('gpio', distance_cm=5, dispatch_latency=0.0005)
+    assert near_error < 1, 'edge timing should not depend on the pin level at callback time'